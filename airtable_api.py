@@ -6,7 +6,8 @@ import base64
 import logging
 import re
 import json
-from typing import Dict, Optional, Any, List, Union
+import threading
+from typing import Dict, Optional, Any, List, Union, Tuple
 
 # Configuration du logging
 logging.basicConfig(
@@ -15,6 +16,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("airtable_api")
 
+# Nombre maximal d'enregistrements acceptés par Airtable dans une requête batch
+AIRTABLE_MAX_RECORDS_PER_REQUEST = 10
+
 class AirtableAPI:
     def __init__(self):
         """Initialisation de la connexion à Airtable"""
@@ -22,6 +26,12 @@ class AirtableAPI:
             self.table = Table(AIRTABLE_API_KEY, AIRTABLE_BASE_ID, AIRTABLE_SUPPLIER_TABLE_NAME)
             logger.info(f"Connexion établie à la table Airtable: {AIRTABLE_SUPPLIER_TABLE_NAME}")
             
+            # Cache des enregistrements déjà trouvés ou créés, indexé par ID Sellsy
+            self._records_cache: Dict[str, Dict] = {}
+            self._records_cache_lock = threading.Lock()
+            # Passe à True une fois toutes les factures existantes chargées dans le cache
+            self._records_cache_complete = False
+            
             # Dictionnaire de traduction des statuts (étapes) de l'anglais vers le français
             self.status_translations = {
                 "draft": "Brouillon",
@@ -393,11 +403,13 @@ class AirtableAPI:
         client_abonne_id = ""
         client_abonne_name = ""
 
-        # Ajouter ce code pour mieux comprendre la structure des champs personnalisés
+        # Structure des champs personnalisés : sérialisation indentée seulement en DEBUG
         if "customfields" in invoice:
-            logger.info(f"Structure des champs personnalisés (customfields): {json.dumps(invoice['customfields'], indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Structure des champs personnalisés (customfields): {json.dumps(invoice['customfields'], indent=2)}")
         elif "custom_fields" in invoice:
-            logger.info(f"Structure des champs personnalisés (custom_fields): {json.dumps(invoice['custom_fields'], indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Structure des champs personnalisés (custom_fields): {json.dumps(invoice['custom_fields'], indent=2)}")
         else:
             logger.info("Aucun champ personnalisé trouvé dans la facture")
 
@@ -586,7 +598,8 @@ class AirtableAPI:
                 logger.info(f"Nom client abonné ajouté: {client_abonne_name}")
         
         logger.info(f"Facture {invoice_id} formatée avec succès")
-        logger.info(f"Résultat formaté: {json.dumps(result, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Résultat formaté: {json.dumps(result, indent=2)}")
         return result
 
     def _format_date(self, date_str: str) -> Optional[str]:
@@ -670,20 +683,64 @@ class AirtableAPI:
         if not sellsy_id:
             logger.warning("ID Sellsy vide, impossible de rechercher la facture fournisseur")
             return None
+
+        sellsy_id = str(sellsy_id)
+        with self._records_cache_lock:
+            cached_record = self._records_cache.get(sellsy_id)
+        if cached_record:
+            logger.debug("Facture %s trouvée dans le cache Airtable", sellsy_id)
+            return cached_record
+        if self._records_cache_complete:
+            # Toutes les factures existantes ont été préchargées : inutile d'interroger Airtable
+            logger.debug("Facture %s absente d'Airtable (d'après le préchargement)", sellsy_id)
+            return None
             
-        # Sécurité : conversion en chaîne et échappement des apostrophes
-        sellsy_id = str(sellsy_id).replace("'", "''")
-        formula = f"{{ID_Facture_Fournisseur}}='{sellsy_id}'"
+        # Sécurité : échappement des apostrophes
+        escaped_id = sellsy_id.replace("'", "''")
+        formula = f"{{ID_Facture_Fournisseur}}='{escaped_id}'"
         logger.info(f"Recherche dans Airtable avec formule : {formula}")
         
         try:
             records = self.table.all(formula=formula)
             logger.info(f"Résultat de recherche : {len(records)} enregistrement(s) trouvé(s).")
+            if records:
+                self._cache_record(sellsy_id, records[0])
             return records[0] if records else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de la facture {sellsy_id} : {e}")
             return None
 
+    def load_existing_invoice_ids(self) -> frozenset:
+        """
+        Précharge en une seule requête paginée toutes les factures fournisseur déjà présentes
+        dans Airtable, pour éviter une recherche par facture lors des synchronisations
+        
+        Returns:
+            Ensemble des IDs Sellsy déjà synchronisés (vide en cas d'erreur)
+        """
+        logger.info("Préchargement des factures fournisseur existantes dans Airtable")
+        try:
+            records = self.table.all(fields=["ID_Facture_Fournisseur"])
+        except Exception as e:
+            logger.error(f"Erreur lors du préchargement des factures Airtable: {e}")
+            return frozenset()
+
+        with self._records_cache_lock:
+            for record in records:
+                sellsy_id = record.get("fields", {}).get("ID_Facture_Fournisseur")
+                if sellsy_id:
+                    self._records_cache[str(sellsy_id)] = record
+            existing_ids = frozenset(self._records_cache)
+            self._records_cache_complete = True
+
+        logger.info(f"{len(existing_ids)} factures fournisseur déjà présentes dans Airtable")
+        return existing_ids
+
+    def _cache_record(self, sellsy_id: str, record: Dict) -> None:
+        """Mémorise l'enregistrement Airtable associé à une facture Sellsy"""
+        with self._records_cache_lock:
+            self._records_cache[str(sellsy_id)] = record
+
     def encode_file_to_base64(self, file_path: str) -> Optional[str]:
         """
         Encode un fichier en base64 pour Airtable
@@ -713,12 +770,53 @@ class AirtableAPI:
                     logger.warning(f"Le fichier {file_path} ne semble pas être un PDF valide")
                 
                 encoded_string = base64.b64encode(file.read()).decode('utf-8')
-                logger.debug(f"Fichier {file_path} encodé avec succès ({len(encoded_string)} caractères)")
+                logger.debug("Fichier %s encodé avec succès (%d caractères)", file_path, len(encoded_string))
                 return encoded_string
         except Exception as e:
             logger.error(f"Erreur lors de l'encodage du fichier {file_path}: {e}")
             return None
 
+    def _prepare_airtable_data(self, invoice_data: Dict, pdf_path: Optional[str], sellsy_id: str) -> Dict:
+        """
+        Prépare les champs Airtable d'une facture, avec le PDF en pièce jointe si disponible
+        
+        Args:
+            invoice_data: Données de la facture formatées pour Airtable
+            pdf_path: Chemin vers le fichier PDF (optionnel)
+            sellsy_id: ID Sellsy de la facture (pour les logs)
+            
+        Returns:
+            Copie des données enrichie du PDF ou du lien PDF
+        """
+        airtable_data = invoice_data.copy()
+        
+        # Traitement du PDF via chemin local si disponible
+        if pdf_path and os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+            logger.info(f"Ajout du PDF pour la facture {sellsy_id}: {pdf_path}")
+
+            pdf_base64 = self.encode_file_to_base64(pdf_path)
+            if pdf_base64:
+                airtable_data["PDF"] = [
+                    {
+                        "url": f"data:application/pdf;base64,{pdf_base64}",
+                        "filename": os.path.basename(pdf_path)
+                    }
+                ]
+            else:
+                logger.warning(f"Impossible d'encoder le PDF pour la facture {sellsy_id}")
+        
+        # Téléchargement et intégration du PDF depuis l'URL si disponible
+        elif "PDF_URL" in airtable_data and airtable_data["PDF_URL"]:
+            pdf_url = airtable_data["PDF_URL"]
+            logger.info(f"URL du PDF disponible pour la facture {sellsy_id}: {pdf_url}")
+            
+            # Si nous avons seulement l'URL du PDF, la conserver pour affichage
+            # Airtable utilisera cette URL pour afficher un lien vers le PDF
+            airtable_data["Lien_PDF"] = pdf_url
+            logger.info(f"Lien PDF ajouté pour la facture {sellsy_id}")
+
+        return airtable_data
+
     def insert_or_update_supplier_invoice(self, invoice_data: Dict, pdf_path: Optional[str] = None) -> Optional[str]:
         """
         Insère ou met à jour une facture fournisseur dans Airtable avec son PDF si disponible
@@ -741,32 +839,7 @@ class AirtableAPI:
         
         try:
             # Préparation des données
-            airtable_data = invoice_data.copy()
-            
-            # Traitement du PDF via chemin local si disponible
-            if pdf_path and os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                logger.info(f"Ajout du PDF pour la facture {sellsy_id}: {pdf_path}")
-
-                pdf_base64 = self.encode_file_to_base64(pdf_path)
-                if pdf_base64:
-                    airtable_data["PDF"] = [
-                        {
-                            "url": f"data:application/pdf;base64,{pdf_base64}",
-                            "filename": os.path.basename(pdf_path)
-                        }
-                    ]
-                else:
-                    logger.warning(f"Impossible d'encoder le PDF pour la facture {sellsy_id}")
-            
-            # Téléchargement et intégration du PDF depuis l'URL si disponible
-            elif "PDF_URL" in airtable_data and airtable_data["PDF_URL"]:
-                pdf_url = airtable_data["PDF_URL"]
-                logger.info(f"URL du PDF disponible pour la facture {sellsy_id}: {pdf_url}")
-                
-                # Si nous avons seulement l'URL du PDF, la conserver pour affichage
-                # Airtable utilisera cette URL pour afficher un lien vers le PDF
-                airtable_data["Lien_PDF"] = pdf_url
-                logger.info(f"Lien PDF ajouté pour la facture {sellsy_id}")
+            airtable_data = self._prepare_airtable_data(invoice_data, pdf_path, sellsy_id)
 
             # Recherche d'un enregistrement existant
             existing_record = self.find_supplier_invoice_by_id(sellsy_id)
@@ -780,13 +853,93 @@ class AirtableAPI:
             else:
                 logger.info(f"Facture fournisseur {sellsy_id} non trouvée, insertion en cours...")
                 record = self.table.create(airtable_data)
+                self._cache_record(sellsy_id, record)
                 logger.info(f"Facture fournisseur {sellsy_id} ajoutée avec succès (ID: {record['id']}).")
                 return record['id']
         except Exception as e:
             logger.error(f"Erreur lors de l'insertion/mise à jour de la facture {sellsy_id}: {e}")
-            logger.debug(f"Clés dans les données: {list(invoice_data.keys()) if invoice_data else 'N/A'}")
+            # L'enregistrement mis en cache a pu être supprimé entre-temps : forcer une nouvelle recherche
+            with self._records_cache_lock:
+                self._records_cache.pop(sellsy_id, None)
+            logger.debug("Clés dans les données: %s", list(invoice_data.keys()) if invoice_data else "N/A")
             return None
 
+    def batch_insert_or_update_supplier_invoices(self, invoices: List[Tuple[Dict, Optional[str]]]) -> List[Optional[str]]:
+        """
+        Insère ou met à jour un lot de factures fournisseur via les endpoints batch d'Airtable
+        (10 enregistrements par requête). En cas d'échec d'un lot, chaque facture est retentée
+        individuellement.
+        
+        Args:
+            invoices: Liste de tuples (données formatées pour Airtable, chemin du PDF ou None)
+            
+        Returns:
+            Liste des IDs d'enregistrements Airtable, dans l'ordre du lot (None en cas d'erreur)
+        """
+        results: List[Optional[str]] = [None] * len(invoices)
+        to_create = []  # (index, ID Sellsy, champs)
+        to_update = []  # (index, ID Sellsy, ID d'enregistrement, champs)
+
+        sellsy_ids = [
+            str(invoice_data.get("ID_Facture_Fournisseur", "")) if invoice_data else ""
+            for invoice_data, _ in invoices
+        ]
+        # Une facture présente plusieurs fois dans le lot n'est écrite qu'une fois (dernière occurrence) :
+        # sinon ses copies partiraient toutes dans batch_create et créeraient des doublons dans Airtable
+        last_index = {sellsy_id: idx for idx, sellsy_id in enumerate(sellsy_ids) if sellsy_id}
+        duplicates = []  # (index, index de la dernière occurrence)
+
+        for idx, (invoice_data, pdf_path) in enumerate(invoices):
+            sellsy_id = sellsy_ids[idx]
+            if not sellsy_id:
+                logger.error("ID Sellsy manquant dans les données, facture ignorée dans le lot")
+                continue
+            if last_index[sellsy_id] != idx:
+                logger.warning(f"Facture {sellsy_id} présente plusieurs fois dans le lot, seule la dernière occurrence est écrite")
+                duplicates.append((idx, last_index[sellsy_id]))
+                continue
+
+            fields = self._prepare_airtable_data(invoice_data, pdf_path, sellsy_id)
+
+            existing_record = self.find_supplier_invoice_by_id(sellsy_id)
+            if existing_record:
+                to_update.append((idx, sellsy_id, existing_record["id"], fields))
+            else:
+                to_create.append((idx, sellsy_id, fields))
+
+        if to_update:
+            logger.info(f"Mise à jour groupée de {len(to_update)} factures fournisseur...")
+            try:
+                self.table.batch_update([{"id": record_id, "fields": fields} for _, _, record_id, fields in to_update])
+                for idx, _, record_id, _ in to_update:
+                    results[idx] = record_id
+            except Exception as e:
+                logger.error(f"Erreur lors de la mise à jour groupée, repli facture par facture: {e}")
+                for idx, _, _, _ in to_update:
+                    results[idx] = self.insert_or_update_supplier_invoice(*invoices[idx])
+
+        if to_create:
+            logger.info(f"Insertion groupée de {len(to_create)} factures fournisseur...")
+        # Une requête par tranche de 10 : en cas d'échec, seul le repli de la tranche concernée est
+        # exécuté, sans recréer les factures déjà insérées par les tranches précédentes
+        for start in range(0, len(to_create), AIRTABLE_MAX_RECORDS_PER_REQUEST):
+            chunk = to_create[start:start + AIRTABLE_MAX_RECORDS_PER_REQUEST]
+            try:
+                records = self.table.batch_create([fields for _, _, fields in chunk])
+                for (idx, sellsy_id, _), record in zip(chunk, records):
+                    self._cache_record(sellsy_id, record)
+                    results[idx] = record["id"]
+            except Exception as e:
+                logger.error(f"Erreur lors de l'insertion groupée, repli facture par facture: {e}")
+                for idx, _, _ in chunk:
+                    results[idx] = self.insert_or_update_supplier_invoice(*invoices[idx])
+
+        for idx, kept_idx in duplicates:
+            results[idx] = results[kept_idx]
+
+        logger.info(f"Lot Airtable traité: {sum(1 for r in results if r)}/{len(invoices)} factures écrites")
+        return results
+
     def format_supplier_invoice_for_airtable(self, invoice: Dict) -> Optional[Dict]:
         """
         Alias pour maintenir la compatibilité avec l'ancien code
@@ -817,24 +970,25 @@ class AirtableAPI:
             
             # Téléchargement avec timeout
             logger.info(f"Téléchargement du PDF depuis {url}")
-            response = requests.get(url, timeout=30, stream=True)
-            
-            # Vérification de la réponse HTTP
-            if response.status_code != 200:
-                logger.warning(f"Échec du téléchargement du PDF: statut HTTP {response.status_code}")
-                return False
-            
-            # Vérification du type de contenu
-            content_type = response.headers.get('Content-Type', '')
-            if 'application/pdf' not in content_type and not url.lower().endswith('.pdf'):
-                logger.warning(f"Le contenu téléchargé n'est pas un PDF: {content_type}")
-                # On continue quand même, car parfois le type MIME peut être incorrect
-            
-            # Sauvegarde du fichier
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # La réponse est fermée en sortie de bloc, y compris en cas d'erreur HTTP
+            with requests.get(url, timeout=(5, 60), stream=True) as response:
+                
+                # Vérification de la réponse HTTP
+                if response.status_code != 200:
+                    logger.warning(f"Échec du téléchargement du PDF: statut HTTP {response.status_code}")
+                    return False
+                
+                # Vérification du type de contenu
+                content_type = response.headers.get('Content-Type', '')
+                if 'application/pdf' not in content_type and not url.lower().endswith('.pdf'):
+                    logger.warning(f"Le contenu téléchargé n'est pas un PDF: {content_type}")
+                    # On continue quand même, car parfois le type MIME peut être incorrect
+                
+                # Sauvegarde du fichier par blocs de 64 Ko
+                with open(output_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        if chunk:
+                            f.write(chunk)
             
             # Vérification du fichier téléchargé
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
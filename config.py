@@ -8,6 +8,30 @@ load_dotenv()
 SELLSY_CLIENT_ID = os.getenv("SELLSY_CLIENT_ID")
 SELLSY_CLIENT_SECRET = os.getenv("SELLSY_CLIENT_SECRET")
 SELLSY_V2_API_URL = os.getenv("SELLSY_V2_API_URL", "https://api.sellsy.com/v2")
+# Nombre maximum de connexions simultanées vers un même hôte Sellsy
+SELLSY_MAX_CONNECTIONS = int(os.getenv("SELLSY_MAX_CONNECTIONS", "32"))
+# Durée de validité (secondes) du cache mémoire des détails de factures, 0 pour le désactiver
+SELLSY_DETAILS_CACHE_TTL = int(os.getenv("SELLSY_DETAILS_CACHE_TTL", "300"))
+# Cache disque des lectures Sellsy, conservé entre deux exécutions (TTL en secondes, 0 pour le désactiver).
+# Détails de factures : quelques minutes seulement, pour reprendre une synchronisation interrompue sans
+# écrire dans Airtable un statut ou des montants périmés. Définitions de champs personnalisés : 24 h.
+SELLSY_DETAILS_DISK_CACHE_DIR = os.getenv("SELLSY_DETAILS_DISK_CACHE_DIR", ".sellsy_details_cache")
+SELLSY_DETAILS_DISK_CACHE_TTL = int(os.getenv("SELLSY_DETAILS_DISK_CACHE_TTL", "900"))
+SELLSY_CF_DISK_CACHE_TTL = int(os.getenv("SELLSY_CF_DISK_CACHE_TTL", "86400"))
+# Fichier du cache disque du token OAuth2 (hors du répertoire des PDF, qui peut être partagé ou archivé)
+SELLSY_TOKEN_CACHE_FILE = os.getenv("SELLSY_TOKEN_CACHE_FILE", ".sellsy_token.json")
+# Débit maximum vers l'API Sellsy (requêtes/seconde, 0 pour désactiver) et taille des rafales.
+# Limite par processus : avec plusieurs workers webhook, chacun dispose de ce débit, à répartir
+# en conséquence pour rester sous le quota du compte Sellsy
+SELLSY_RATE_LIMIT = float(os.getenv("SELLSY_RATE_LIMIT", "5"))
+SELLSY_RATE_BURST = int(os.getenv("SELLSY_RATE_BURST", "10"))
+# Durée de validité (secondes) du cache mémoire des définitions de champs personnalisés, 0 pour le désactiver
+SELLSY_CF_DEFINITIONS_CACHE_TTL = int(os.getenv("SELLSY_CF_DEFINITIONS_CACHE_TTL", "3600"))
+# Taille de page demandée à Purchase.getList (Sellsy applique son propre maximum, lu dans la réponse)
+SELLSY_PAGE_SIZE = int(os.getenv("SELLSY_PAGE_SIZE", "100"))
+# Champs (séparés par des virgules) qu'un résumé de Purchase.getList doit contenir ; s'il en manque un,
+# les détails de la facture sont récupérés via Purchase.getOne. Vide : aucun appel supplémentaire.
+REQUIRED_DETAIL_FIELDS = [field.strip() for field in os.getenv("REQUIRED_DETAIL_FIELDS", "").split(",") if field.strip()]
 
 # Airtable
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
@@ -17,6 +41,18 @@ AIRTABLE_SUPPLIER_TABLE_NAME = os.getenv("AIRTABLE_SUPPLIER_TABLE_NAME")
 # Webhook & PDF
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
 PDF_STORAGE_DIR = os.getenv("PDF_STORAGE_DIR", "pdf_invoices_suppliers")
+# Délai (secondes) pendant lequel un PDF dont la récupération a échoué n'est pas redemandé par les
+# synchronisations par lot (le webhook le redemande toujours), 0 pour le désactiver
+PDF_FAILURE_RETRY_DELAY = int(os.getenv("PDF_FAILURE_RETRY_DELAY", "3600"))
+# Nombre de processus uvicorn du serveur webhook. Un seul par défaut : chaque processus a ses propres
+# clients Sellsy/Airtable et sa propre limite SELLSY_RATE_LIMIT
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+
+# Synchronisation parallèle
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "8"))
+# Nombre de factures écrites par lot dans Airtable (l'API accepte 10 enregistrements par requête,
+# une valeur supérieure est ramenée à 10)
+AIRTABLE_BATCH_SIZE = max(1, min(int(os.getenv("AIRTABLE_BATCH_SIZE", "10")), 10))
 
 # Liste des variables obligatoires pour faire fonctionner l'app
 required_vars = {
@@ -2,8 +2,8 @@ import argparse
 from sellsy_api import SellsySupplierAPI
 from airtable_api import AirtableAPI
 import uvicorn
-from webhook_handler import app
-import time
+from config import SYNC_MAX_WORKERS, AIRTABLE_BATCH_SIZE, WEBHOOK_WORKERS
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
 import logging
 
@@ -14,97 +14,202 @@ logging.basicConfig(
 )
 logger = logging.getLogger("main")
 
-def sync_supplier_invoices(limit=1000, days=365):
+def get_supplier_invoice_id(invoice):
+    """Retourne l'ID d'une facture fournisseur (docid, id ou doc_id) ou None"""
+    for id_field in ["docid", "id", "doc_id"]:
+        if id_field in invoice and invoice[id_field]:
+            return str(invoice[id_field])
+    return None
+
+def write_airtable_batch(airtable, pending, label, total):
+    """
+    Écrit dans Airtable un lot de factures préparées
+    
+    Args:
+        pending: Liste de tuples (ID facture, position, facture formatée, chemin du PDF)
+        label: Libellé du type de facture pour l'affichage
+        total: Nombre total de factures de la synchronisation
+        
+    Returns:
+        Tuple (nombre de succès, nombre d'erreurs)
+    """
+    results = airtable.batch_insert_or_update_supplier_invoices(
+        [(formatted_invoice, pdf_path) for _, _, formatted_invoice, pdf_path in pending]
+    )
+
+    success_count = 0
+    for (invoice_id, position, _, _), result in zip(pending, results):
+        if result:
+            logger.debug("✅ %s %s traitée (%s/%s).", label, invoice_id, position, total)
+            success_count += 1
+        else:
+            print(f"⚠️ Échec de l'insertion dans Airtable pour la facture {invoice_id}")
+
+    return success_count, len(pending) - success_count
+
+def prepare_supplier_invoice(sellsy, airtable, invoice, invoice_id, position, total):
+    """
+    Prépare une facture fournisseur pour Airtable : formatage et récupération du PDF
+    
+    Returns:
+        Tuple (facture formatée, chemin du PDF) ou None en cas d'erreur
+    """
+    try:
+        logger.debug("Traitement de la facture fournisseur %s (%s/%s)...", invoice_id, position, total or "?")
+
+        # Résumé issu de Purchase.getList, complété des détails si des champs requis manquaient.
+        # Vérifier et compléter les données de base
+        if not invoice.get("id"):
+            invoice["id"] = invoice_id
+        if not invoice.get("docid"):
+            invoice["docid"] = invoice_id
+
+        # Afficher les clés principales pour débogage
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Structure de la facture - Clés principales: %s...", list(invoice)[:10])
+        
+        formatted_invoice = airtable.format_invoice_for_airtable(invoice)
+        
+        # Récupérer le PDF
+        pdf_path = sellsy.get_supplier_invoice_pdf(invoice_id)
+
+        if not formatted_invoice:
+            print(f"⚠️ La facture fournisseur {invoice_id} n'a pas pu être formatée correctement")
+            return None
+
+        return formatted_invoice, pdf_path
+            
+    except Exception as e:
+        print(f"❌ Erreur lors du traitement de la facture fournisseur {invoice_id}: {e}")
+        return None
+
+def sync_supplier_invoices(limit=1000, days=365, max_workers=SYNC_MAX_WORKERS):
     """Synchronise les factures fournisseur (limitées à N factures max)"""
     sellsy = SellsySupplierAPI()
     airtable = AirtableAPI()
 
     print(f"Récupération des factures fournisseur (limite {limit}, jours {days})...")
 
-    invoices = sellsy.get_supplier_invoices(limit=limit, days=days)
+    # Une seule lecture paginée d'Airtable au lieu d'une recherche par facture : le cache
+    # préchargé répond ensuite aux recherches faites lors de l'écriture des lots
+    airtable.load_existing_invoice_ids()
 
-    if not invoices:
-        print("Aucune facture fournisseur trouvée.")
-        return
-
-    print(f"{len(invoices)} factures fournisseur trouvées.")
     success_count = 0
     error_count = 0
+    invoice_count = 0
 
-    for idx, invoice in enumerate(invoices):
-        try:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Chaque facture est confiée au pool dès que sa page de Purchase.getList est reçue :
+        # PDF et formatage démarrent pendant que les pages suivantes sont récupérées.
+        # Les détails (Purchase.getOne) ne sont demandés que pour les résumés incomplets
+        futures = {}
+        invoices = sellsy.iter_supplier_invoices(limit=limit, days=days, enrich=True)
+        for idx, invoice in enumerate(invoices):
+            invoice_count += 1
             # Vérification de la présence d'un ID valide
-            invoice_id = None
-            for id_field in ["docid", "id", "doc_id"]:
-                if id_field in invoice and invoice[id_field]:
-                    invoice_id = str(invoice[id_field])
-                    break
-                    
+            invoice_id = get_supplier_invoice_id(invoice)
             if not invoice_id:
                 print(f"⚠️ ID de facture manquant pour l'index {idx}")
                 error_count += 1
                 continue
-                
-            print(f"Traitement de la facture fournisseur {invoice_id} ({idx+1}/{len(invoices)})...")
 
-            if idx > 0 and idx % 10 == 0:
-                print("Pause de 2 secondes pour éviter les limitations d'API...")
-                time.sleep(2)
+            future = executor.submit(
+                prepare_supplier_invoice, sellsy, airtable,
+                invoice, invoice_id, idx + 1, None
+            )
+            futures[future] = (invoice_id, idx + 1)
 
-            # Récupérer les détails complets de la facture
-            invoice_details = sellsy.get_supplier_invoice_details(invoice_id)
-            
-            # Variable pour stocker les données de facture à utiliser
-            invoice_data = None
-            
-            if invoice_details and invoice_details.get("status") == "success" and "response" in invoice_details:
-                invoice_data = invoice_details["response"]
-                # Vérifier que les données contiennent bien un ID
-                if not invoice_data.get("id") and not invoice_data.get("docid"):
-                    invoice_data["id"] = invoice_id
-                    invoice_data["docid"] = invoice_id
-            else:
-                print(f"⚠️ Impossible de récupérer les détails de la facture {invoice_id} - utilisation des données de base")
-                invoice_data = invoice
-                # Vérifier et compléter les données de base
-                if not invoice_data.get("id"):
-                    invoice_data["id"] = invoice_id
-                if not invoice_data.get("docid"):
-                    invoice_data["docid"] = invoice_id
-            
-            # Formatage et traitement de la facture
-            if invoice_data:
-                # Afficher les clés principales pour débogage
-                keys = list(invoice_data.keys())
-                print(f"Structure de la facture - Clés principales: {keys[:10]}...")
-                
-                formatted_invoice = airtable.format_invoice_for_airtable(invoice_data)
-                
-                # Récupérer le PDF
-                pdf_path = sellsy.get_supplier_invoice_pdf(invoice_id)
-
-                if formatted_invoice:
-                    result = airtable.insert_or_update_supplier_invoice(formatted_invoice, pdf_path)
-                    if result:
-                        print(f"✅ Facture fournisseur {invoice_id} traitée ({idx+1}/{len(invoices)}).")
-                        success_count += 1
-                    else:
-                        print(f"⚠️ Échec de l'insertion dans Airtable pour la facture {invoice_id}")
-                        error_count += 1
-                else:
-                    print(f"⚠️ La facture fournisseur {invoice_id} n'a pas pu être formatée correctement")
-                    error_count += 1
-            else:
-                print(f"⚠️ Données insuffisantes pour la facture {invoice_id}")
+        if not invoice_count:
+            print("Aucune facture fournisseur trouvée.")
+            return
+
+        print(f"{invoice_count} factures fournisseur trouvées.")
+
+        # Les factures préparées sont écrites dans Airtable par lots depuis le thread principal
+        pending = []
+        for future in as_completed(futures):
+            prepared = future.result()
+            if not prepared:
                 error_count += 1
-                
-        except Exception as e:
-            print(f"❌ Erreur lors du traitement de la facture fournisseur {invoice.get('docid', invoice.get('id', 'ID inconnu'))}: {e}")
-            error_count += 1
+                continue
+
+            pending.append(futures[future] + prepared)
+            if len(pending) >= AIRTABLE_BATCH_SIZE:
+                successes, errors = write_airtable_batch(airtable, pending, "Facture fournisseur", invoice_count)
+                success_count += successes
+                error_count += errors
+                pending = []
+
+        if pending:
+            successes, errors = write_airtable_batch(airtable, pending, "Facture fournisseur", invoice_count)
+            success_count += successes
+            error_count += errors
 
     print(f"Synchronisation des factures fournisseur terminée. Succès: {success_count}, Erreurs: {error_count}")
 
-def sync_ocr_invoices(limit=1000, days=365):
+def prepare_ocr_invoice(sellsy, airtable, invoice, invoice_id, position, total):
+    """
+    Prépare une facture OCR pour Airtable : récupération des détails, formatage et PDF
+    
+    Returns:
+        Tuple (facture formatée, chemin du PDF) ou None en cas d'erreur
+    """
+    try:
+        logger.debug("Traitement de la facture OCR %s (%s/%s)...", invoice_id, position, total)
+
+        # Récupérer les détails complets
+        invoice_details = sellsy.get_invoice_details(invoice_id)
+        
+        # Variable pour stocker les données à utiliser
+        invoice_data = None
+        
+        if invoice_details:
+            invoice_data = invoice_details
+            # Vérifier que l'ID est présent
+            if not invoice_data.get("id"):
+                invoice_data["id"] = invoice_id
+        else:
+            print(f"⚠️ Impossible de récupérer les détails de la facture OCR {invoice_id} - utilisation des données de base")
+            invoice_data = invoice
+            # S'assurer que l'ID est présent
+            if not invoice_data.get("id"):
+                invoice_data["id"] = invoice_id
+        
+        # Formatage et traitement de la facture
+        if not invoice_data:
+            print(f"⚠️ Données insuffisantes pour la facture OCR {invoice_id}")
+            return None
+
+        # Afficher les clés principales pour débogage
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Structure de la facture OCR - Clés principales: %s...", list(invoice_data)[:10])
+        
+        formatted_invoice = airtable.format_invoice_for_airtable(invoice_data)
+
+        # Récupérer l'URL du PDF
+        pdf_url = None
+        for field in ["pdf_url", "pdfUrl", "downloadUrl", "public_link", "pdf"]:
+            if field in invoice_data and invoice_data[field]:
+                pdf_url = invoice_data[field]
+                break
+                
+        pdf_path = None
+        if pdf_url:
+            # Préfixe distinct : les IDs OCR et les IDs de factures fournisseur sont indépendants
+            # et ne doivent pas partager le même fichier PDF local
+            pdf_path = sellsy.download_invoice_pdf(pdf_url, f"ocr_{invoice_id}")
+
+        if not formatted_invoice:
+            print(f"⚠️ La facture OCR {invoice_id} n'a pas pu être formatée correctement")
+            return None
+
+        return formatted_invoice, pdf_path
+            
+    except Exception as e:
+        print(f"❌ Erreur lors du traitement de la facture OCR {invoice_id}: {e}")
+        return None
+
+def sync_ocr_invoices(limit=1000, days=365, max_workers=SYNC_MAX_WORKERS):
     """Synchronise les factures OCR des X derniers jours (limitées à N factures max)"""
     sellsy = SellsySupplierAPI()
     airtable = AirtableAPI()
@@ -121,83 +226,62 @@ def sync_ocr_invoices(limit=1000, days=365):
     success_count = 0
     error_count = 0
 
-    for idx, invoice in enumerate(invoices):
-        try:
+    # Une seule lecture paginée d'Airtable au lieu d'une recherche par facture : le cache
+    # préchargé répond ensuite aux recherches faites lors de l'écriture des lots
+    airtable.load_existing_invoice_ids()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for idx, invoice in enumerate(invoices):
             # Vérification de la présence d'un ID valide
             if not invoice.get("id"):
                 print(f"⚠️ ID de facture OCR manquant pour l'index {idx}")
                 error_count += 1
                 continue
-                
-            invoice_id = str(invoice["id"])
-            print(f"Traitement de la facture OCR {invoice_id} ({idx+1}/{len(invoices)})...")
 
-            if idx > 0 and idx % 10 == 0:
-                print("Pause de 2 secondes pour éviter les limitations d'API...")
-                time.sleep(2)
+            invoice_id = str(invoice["id"])
+            future = executor.submit(
+                prepare_ocr_invoice, sellsy, airtable,
+                invoice, invoice_id, idx + 1, len(invoices)
+            )
+            futures[future] = (invoice_id, idx + 1)
 
-            # Récupérer les détails complets
-            invoice_details = sellsy.get_invoice_details(invoice_id)
-            
-            # Variable pour stocker les données à utiliser
-            invoice_data = None
-            
-            if invoice_details:
-                invoice_data = invoice_details
-                # Vérifier que l'ID est présent
-                if not invoice_data.get("id"):
-                    invoice_data["id"] = invoice_id
-            else:
-                print(f"⚠️ Impossible de récupérer les détails de la facture OCR {invoice_id} - utilisation des données de base")
-                invoice_data = invoice
-                # S'assurer que l'ID est présent
-                if not invoice_data.get("id"):
-                    invoice_data["id"] = invoice_id
-            
-            # Formatage et traitement de la facture
-            if invoice_data:
-                # Afficher les clés principales pour débogage
-                keys = list(invoice_data.keys())
-                print(f"Structure de la facture OCR - Clés principales: {keys[:10]}...")
-                
-                formatted_invoice = airtable.format_invoice_for_airtable(invoice_data)
-
-                # Récupérer l'URL du PDF
-                pdf_url = None
-                for field in ["pdf_url", "pdfUrl", "downloadUrl", "public_link", "pdf"]:
-                    if field in invoice_data and invoice_data[field]:
-                        pdf_url = invoice_data[field]
-                        break
-                        
-                pdf_path = None
-                if pdf_url:
-                    pdf_path = sellsy.download_invoice_pdf(pdf_url, invoice_id)
-
-                if formatted_invoice:
-                    result = airtable.insert_or_update_supplier_invoice(formatted_invoice, pdf_path)
-                    if result:
-                        print(f"✅ Facture OCR {invoice_id} traitée ({idx+1}/{len(invoices)}).")
-                        success_count += 1
-                    else:
-                        print(f"⚠️ Échec de l'insertion dans Airtable pour la facture OCR {invoice_id}")
-                        error_count += 1
-                else:
-                    print(f"⚠️ La facture OCR {invoice_id} n'a pas pu être formatée correctement")
-                    error_count += 1
-            else:
-                print(f"⚠️ Données insuffisantes pour la facture OCR {invoice_id}")
+        # Les factures préparées sont écrites dans Airtable par lots depuis le thread principal
+        pending = []
+        for future in as_completed(futures):
+            prepared = future.result()
+            if not prepared:
                 error_count += 1
-                
-        except Exception as e:
-            print(f"❌ Erreur lors du traitement de la facture OCR {invoice.get('id', 'ID inconnu')}: {e}")
-            error_count += 1
+                continue
+
+            pending.append(futures[future] + prepared)
+            if len(pending) >= AIRTABLE_BATCH_SIZE:
+                successes, errors = write_airtable_batch(airtable, pending, "Facture OCR", len(invoices))
+                success_count += successes
+                error_count += errors
+                pending = []
+
+        if pending:
+            successes, errors = write_airtable_batch(airtable, pending, "Facture OCR", len(invoices))
+            success_count += successes
+            error_count += errors
 
     print(f"Synchronisation des factures OCR terminée. Succès: {success_count}, Erreurs: {error_count}")
 
-def start_webhook_server(host="0.0.0.0", port=8000):
+def start_webhook_server(host="0.0.0.0", port=8000, workers=WEBHOOK_WORKERS):
     """Démarre le serveur webhook FastAPI"""
-    print(f"Démarrage du serveur webhook sur {host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    print(f"Démarrage du serveur webhook sur {host}:{port} ({workers} workers)")
+    # L'application est passée par son chemin d'import, requis par uvicorn pour lancer plusieurs workers ;
+    # uvloop et httptools sont utilisés automatiquement lorsqu'ils sont installés
+    uvicorn.run(
+        "webhook_handler:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        log_level="info"
+    )
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Outil de synchronisation Sellsy - Airtable")
@@ -208,24 +292,27 @@ if __name__ == "__main__":
     ocr_parser = subparsers.add_parser("sync-ocr", help="Synchroniser les factures OCR (API V2)")
     ocr_parser.add_argument("--limit", type=int, default=1000, help="Nombre maximum de factures à synchroniser")
     ocr_parser.add_argument("--days", type=int, default=30, help="Nombre de jours à synchroniser")
+    ocr_parser.add_argument("--workers", type=int, default=SYNC_MAX_WORKERS, help="Nombre de factures traitées en parallèle")
 
     # Commande pour les factures fournisseur via API V1
     supplier_parser = subparsers.add_parser("sync-supplier", help="Synchroniser les factures fournisseur (API V1)")
     supplier_parser.add_argument("--limit", type=int, default=1000, help="Nombre maximum de factures fournisseur à synchroniser")
     supplier_parser.add_argument("--days", type=int, default=30, help="Nombre de jours à synchroniser")
+    supplier_parser.add_argument("--workers", type=int, default=SYNC_MAX_WORKERS, help="Nombre de factures traitées en parallèle")
 
     # Commande pour le serveur webhook
     webhook_parser = subparsers.add_parser("webhook", help="Démarrer le serveur webhook")
     webhook_parser.add_argument("--host", type=str, default="0.0.0.0", help="Hôte du serveur")
     webhook_parser.add_argument("--port", type=int, default=8000, help="Port du serveur")
+    webhook_parser.add_argument("--workers", type=int, default=WEBHOOK_WORKERS, help="Nombre de processus du serveur")
 
     args = parser.parse_args()
 
     if args.command == "sync-ocr":
-        sync_ocr_invoices(limit=args.limit, days=args.days)
+        sync_ocr_invoices(limit=args.limit, days=args.days, max_workers=args.workers)
     elif args.command == "sync-supplier":
-        sync_supplier_invoices(limit=args.limit, days=args.days)
+        sync_supplier_invoices(limit=args.limit, days=args.days, max_workers=args.workers)
     elif args.command == "webhook":
-        start_webhook_server(args.host, args.port)
+        start_webhook_server(args.host, args.port, args.workers)
     else:
         parser.print_help()
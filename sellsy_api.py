@@ -2,15 +2,35 @@ import os
 import time
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
 import base64
+import hashlib
 import json
 import datetime
-from typing import List, Dict, Optional, Any
+import threading
+import tempfile
+from urllib.parse import urlencode, quote_plus
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from config import (
     SELLSY_CLIENT_ID,
     SELLSY_CLIENT_SECRET,
     SELLSY_V2_API_URL,
-    PDF_STORAGE_DIR
+    SELLSY_MAX_CONNECTIONS,
+    SELLSY_DETAILS_CACHE_TTL,
+    SELLSY_DETAILS_DISK_CACHE_DIR,
+    SELLSY_TOKEN_CACHE_FILE,
+    SELLSY_DETAILS_DISK_CACHE_TTL,
+    SELLSY_CF_DISK_CACHE_TTL,
+    SELLSY_RATE_LIMIT,
+    SELLSY_RATE_BURST,
+    SELLSY_PAGE_SIZE,
+    SELLSY_CF_DEFINITIONS_CACHE_TTL,
+    REQUIRED_DETAIL_FIELDS,
+    PDF_STORAGE_DIR,
+    PDF_FAILURE_RETRY_DELAY
 )
 
 logging.basicConfig(
@@ -19,116 +39,602 @@ logging.basicConfig(
 )
 logger = logging.getLogger("sellsy_supplier_api")
 
+# orjson (plus rapide) est utilisé pour le JSON des échanges avec l'API s'il est installé
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
+def _prune_disk_cache(max_age: int) -> None:
+    """
+    Supprime du cache disque les entrées (et fichiers temporaires abandonnés) plus anciennes
+    que max_age secondes : sans cela, le répertoire garde un fichier par facture lue
+    """
+    now = time.time()
+    try:
+        entries = list(os.scandir(SELLSY_DETAILS_DISK_CACHE_DIR))
+    except OSError as e:
+        logger.warning(f"Impossible de parcourir le cache disque {SELLSY_DETAILS_DISK_CACHE_DIR}: {e}")
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime >= max_age:
+                os.remove(entry.path)
+        except OSError:
+            # Entrée supprimée ou remplacée entre-temps par un autre processus
+            pass
+
+# Répertoires des PDF et du cache disque créés une seule fois à l'import plutôt qu'à chaque
+# instanciation du client, et seulement s'ils n'existent pas encore.
+# Les entrées expirées du cache disque sont purgées au passage
+if not os.path.isdir(PDF_STORAGE_DIR):
+    os.makedirs(PDF_STORAGE_DIR, exist_ok=True)
+if max(SELLSY_DETAILS_DISK_CACHE_TTL, SELLSY_CF_DISK_CACHE_TTL) > 0:
+    if not os.path.isdir(SELLSY_DETAILS_DISK_CACHE_DIR):
+        os.makedirs(SELLSY_DETAILS_DISK_CACHE_DIR, exist_ok=True)
+    else:
+        _prune_disk_cache(max(SELLSY_DETAILS_DISK_CACHE_TTL, SELLSY_CF_DISK_CACHE_TTL))
+
+# Nombre maximum de factures conservées dans le cache mémoire des détails
+DETAILS_CACHE_MAXSIZE = 2048
+
+# Délais maximum (secondes) de connexion et de lecture appliqués à chaque appel HTTP
+DEFAULT_TIMEOUT = (5, 30)
+
+# Taille des blocs lus lors du téléchargement des PDF et délais maximum (secondes) de
+# connexion et d'attente entre deux blocs
+PDF_CHUNK_SIZE = 64 * 1024
+PDF_DOWNLOAD_TIMEOUT = (5, 120)
+
+# Nombre d'octets en début de fichier dans lesquels la signature "%PDF" doit apparaître
+PDF_HEADER_SEARCH_SIZE = 1024
+
+# Répertoire des marqueurs d'échec de récupération des PDF ({ID}.failed), distincts des PDF
+PDF_FAILED_DIR = os.path.join(PDF_STORAGE_DIR, "failed")
+
+# Marge (secondes) avant l'expiration du token OAuth2 à partir de laquelle il est renouvelé
+TOKEN_REFRESH_MARGIN = 60
+
+# Taille maximale (octets) du corps de réponse reproduit dans les logs d'erreur
+ERROR_BODY_LOG_SIZE = 512
+
+def _error_body(response: requests.Response) -> str:
+    """Début du corps d'une réponse en erreur, décodé une seule fois pour les logs"""
+    return response.content[:ERROR_BODY_LOG_SIZE].decode("utf-8", errors="replace")
+
+# En-tête d'authentification Basic de la demande de token OAuth2, calculé une seule fois
+_BASIC_AUTH = "Basic " + base64.b64encode(
+    f"{SELLSY_CLIENT_ID}:{SELLSY_CLIENT_SECRET}".encode('ascii')
+).decode('ascii')
+
+# En-têtes propres à chaque type d'appel, construits une seule fois ; l'Accept JSON, la compression
+# et le token Bearer sont portés par la session
+_TOKEN_HEADERS = {
+    "Authorization": _BASIC_AUTH,
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "application/json"
+}
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+_PDF_HEADERS = {"Accept": "*/*"}
+
+# Début du formulaire API v1 ("method=...&io_mode=json&do_in="), constant pour une méthode donnée
+_V1_FORM_PREFIXES: Dict[str, str] = {}
+
+def _v1_form_prefix(method: str) -> str:
+    """Retourne le début du formulaire API v1 pour une méthode, encodé une seule fois"""
+    prefix = _V1_FORM_PREFIXES.get(method)
+    if prefix is None:
+        prefix = urlencode({"method": method, "io_mode": "json"}) + "&do_in="
+        _V1_FORM_PREFIXES[method] = prefix
+    return prefix
+
+# Corps de la demande de token OAuth2, identique à chaque renouvellement
+_TOKEN_GRANT_BODY = b"grant_type=client_credentials"
+
+# Fichier du cache disque du token OAuth2, réutilisé d'une exécution à l'autre
+TOKEN_CACHE_FILE = SELLSY_TOKEN_CACHE_FILE
+
+# Nombre de nouvelles tentatives après une réponse 429 (trop de requêtes)
+RATE_LIMIT_MAX_RETRIES = 3
+
+class SellsyRetry(Retry):
+    """
+    Politique de nouvelles tentatives de l'adaptateur HTTP, sans prise en charge des 429 :
+    urllib3 retente par défaut toute 429 portant un en-tête Retry-After, ce qui ferait attendre
+    chaque thread de son côté et empêcherait _send de suspendre le limiteur de débit partagé
+    """
+    RETRY_AFTER_STATUS_CODES = frozenset([413, 503])
+
+# Nouvelles tentatives avec attente exponentielle sur les erreurs réseau et les erreurs 5xx.
+# Les 429 ne sont pas retentées ici : _send les traite pour suspendre tous les threads à la fois.
+HTTP_RETRY = SellsyRetry(
+    total=6,
+    connect=3,
+    read=3,
+    status=3,
+    backoff_factor=1.0,
+    status_forcelist=[408, 500, 502, 503, 504],
+    allowed_methods=frozenset(["GET", "POST"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+class TokenBucket:
+    """
+    Limiteur de débit à jetons, partagé entre threads : au plus `rate` requêtes par seconde
+    en régime établi, avec des rafales jusqu'à `capacity` requêtes
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloque jusqu'à ce qu'un jeton soit disponible (sans effet si rate <= 0)"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # Pendant une pause, _updated_at est dans le futur : aucun jeton n'est accumulé
+                if now > self._updated_at:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                    self._updated_at = now
+
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Suspend la délivrance de jetons pendant `seconds` secondes (ex. Retry-After d'une 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            # Le remplissage ne reprend qu'à la fin de la pause : pas de rafale juste après une 429
+            self._updated_at = self._paused_until
+
+def _load_cached_token() -> Optional[Tuple[str, float]]:
+    """
+    Lit le token OAuth2 enregistré sur disque
+    
+    Returns:
+        Tuple (token, horodatage d'expiration), ou None si absent, illisible ou émis pour un autre client
+    """
+    try:
+        with open(TOKEN_CACHE_FILE, "rb") as f:
+            data = _json_loads(f.read())
+        if data.get("client_id") != SELLSY_CLIENT_ID or not data.get("access_token"):
+            return None
+        return data["access_token"], float(data["expires_at"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Cache du token OAuth2 illisible: {e}")
+        return None
+
+def _save_cached_token(token: str, expires_at: float) -> None:
+    """Enregistre le token OAuth2 sur disque (écriture atomique, lisible par le seul propriétaire)"""
+    tmp_path = f"{TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        # Fichier créé directement en 0600 : le token n'est jamais exposé aux autres utilisateurs
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(_json_dumps({
+                "client_id": SELLSY_CLIENT_ID,
+                "access_token": token,
+                "expires_at": expires_at
+            }))
+        os.replace(tmp_path, TOKEN_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Impossible d'enregistrer le cache du token OAuth2: {e}")
+
+# Limite commune à toutes les instances du processus (le quota Sellsy est celui du compte).
+# Chaque processus a la sienne : avec plusieurs workers uvicorn, SELLSY_RATE_LIMIT est à diviser entre eux
+sellsy_rate_limiter = TokenBucket(rate=SELLSY_RATE_LIMIT, capacity=SELLSY_RATE_BURST)
+
 class SellsySupplierAPI:
+    # Token OAuth2 partagé par toutes les instances du processus : (token, horodatage d'expiration)
+    _token_cache: Optional[Tuple[str, float]] = None
+    _token_lock = threading.RLock()
+    # Définitions des champs personnalisés partagées par toutes les instances :
+    # {type d'entité: (horodatage, définitions)}
+    _cf_definitions_cache: Dict[str, Tuple[float, Dict[str, Dict]]] = {}
+    _cf_definitions_lock = threading.Lock()
+
     def __init__(self):
         self.api_v2_url = SELLSY_V2_API_URL
         self.api_v1_url = "https://apifeed.sellsy.com"
         self.token_url = "https://login.sellsy.com/oauth2/access-tokens"
-        self.access_token = self.get_access_token()
 
-        if not self.access_token:
+        # Session HTTP partagée entre les appels et les threads : connexions keep-alive
+        # réutilisées, limitées à SELLSY_MAX_CONNECTIONS connexions simultanées par hôte
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=SELLSY_MAX_CONNECTIONS,
+            pool_block=True,
+            max_retries=HTTP_RETRY
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Compression des réponses : gzip/deflate, plus br (brotli) lorsqu'il est installé
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING
+        })
+
+        # Cache mémoire des détails de factures : {(ID, champs perso): (horodatage, détails)}
+        self._details_cache: Dict[Tuple[str, bool], Tuple[float, Dict]] = {}
+        self._details_cache_lock = threading.Lock()
+
+        self._token_exp = 0.0
+        self.access_token = None
+        token = self.get_access_token()
+
+        if not token:
             raise ValueError("Impossible d'obtenir un token OAuth2 depuis Sellsy.")
+        self._use_token(token)
+
+    def close(self) -> None:
+        """Ferme les connexions de la session HTTP"""
+        self.session.close()
+
+    def __enter__(self) -> "SellsySupplierAPI":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def get_access_token(self, force_refresh: bool = False) -> Optional[str]:
+        """
+        Retourne un token OAuth2 valide, en réutilisant le token partagé entre instances
+        (en mémoire, puis sur disque) tant qu'il n'arrive pas à expiration
+        
+        Args:
+            force_refresh: Si True, demande toujours un nouveau token à Sellsy
+            
+        Returns:
+            Token OAuth2 ou None en cas d'erreur
+        """
+        with SellsySupplierAPI._token_lock:
+            if not force_refresh:
+                cached = SellsySupplierAPI._token_cache
+                if not cached or time.time() >= cached[1] - TOKEN_REFRESH_MARGIN:
+                    cached = _load_cached_token()
+                if cached and time.time() < cached[1] - TOKEN_REFRESH_MARGIN:
+                    SellsySupplierAPI._token_cache = cached
+                    self._token_exp = cached[1]
+                    return cached[0]
 
-        os.makedirs(PDF_STORAGE_DIR, exist_ok=True)
+            token, expires_at = self._request_access_token()
+            if token:
+                SellsySupplierAPI._token_cache = (token, expires_at)
+                self._token_exp = expires_at
+                _save_cached_token(token, expires_at)
+            return token
 
-    def get_access_token(self) -> Optional[str]:
+    def _request_access_token(self) -> Tuple[Optional[str], float]:
+        """
+        Demande un nouveau token OAuth2 à Sellsy
+        
+        Returns:
+            Tuple (token, horodatage d'expiration)
+        """
         logger.info("🔐 Récupération du token OAuth2 Sellsy")
         try:
-            auth_string = f"{SELLSY_CLIENT_ID}:{SELLSY_CLIENT_SECRET}"
-            auth_bytes = auth_string.encode('ascii')
-            auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-
-            headers = {
-                "Authorization": f"Basic {auth_b64}",
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Accept": "application/json"
-            }
-
-            data = "grant_type=client_credentials"
-            response = requests.post(self.token_url, headers=headers, data=data)
+            response = self.session.post(self.token_url, headers=_TOKEN_HEADERS, data=_TOKEN_GRANT_BODY, timeout=DEFAULT_TIMEOUT)
 
             if response.status_code == 200:
-                return response.json().get("access_token")
+                token_data = _json_loads(response.content)
+                expires_at = time.time() + float(token_data.get("expires_in", 3600))
+                return token_data.get("access_token"), expires_at
             else:
-                logger.error(f"Erreur OAuth2 : {response.status_code} {response.text}")
+                logger.error(f"Erreur OAuth2 : {response.status_code} {_error_body(response)}")
         except requests.RequestException as e:
             logger.error(f"Erreur de requête OAuth2 : {e}")
-        return None
+        except ValueError as e:
+            logger.error(f"Réponse OAuth2 illisible : {e}")
+        return None, 0.0
 
-    def _make_get(self, endpoint: str, params: Dict = {}) -> Optional[Dict[str, Any]]:
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Accept": "application/json"
-        }
+    def _ensure_token(self) -> None:
+        """Renouvelle le token OAuth2 s'il expire dans moins de TOKEN_REFRESH_MARGIN secondes"""
+        if time.time() > self._token_exp - TOKEN_REFRESH_MARGIN:
+            token = self.get_access_token()
+            if token:
+                self._use_token(token)
+
+    def _refresh_rejected_token(self, rejected_token: Optional[str]) -> bool:
+        """
+        Renouvelle le token après une réponse 401. Si un autre thread l'a déjà renouvelé
+        entre-temps, son token est réutilisé au lieu d'en demander un nouveau.
+        
+        Args:
+            rejected_token: Token refusé par Sellsy
+            
+        Returns:
+            True si un nouveau token est disponible
+        """
+        with SellsySupplierAPI._token_lock:
+            cached = SellsySupplierAPI._token_cache
+            if cached and cached[0] != rejected_token:
+                token = cached[0]
+                self._token_exp = cached[1]
+            else:
+                logger.warning("🔐 Token OAuth2 refusé par Sellsy (401), renouvellement")
+                token = self.get_access_token(force_refresh=True)
+
+        if not token:
+            return False
+        self._use_token(token)
+        return True
+
+    def _use_token(self, token: str) -> None:
+        """Enregistre le token OAuth2 comme en-tête Authorization par défaut de la session"""
+        self.access_token = token
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _thread_pool(self, max_workers: int) -> ThreadPoolExecutor:
+        """
+        Crée un pool de threads pour des appels Sellsy parallèles, limité à la taille du pool
+        de connexions : au-delà, les threads supplémentaires attendraient une connexion libre
+        """
+        return ThreadPoolExecutor(max_workers=max(1, min(max_workers, SELLSY_MAX_CONNECTIONS)))
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Envoie une requête vers l'API Sellsy via la session partagée, en respectant la limite
+        de débit. Sur une réponse 429, les envois sont suspendus pendant la durée indiquée par
+        l'en-tête Retry-After puis la requête est retentée. Sur une réponse 401, le token est
+        renouvelé et la requête retentée une seule fois.
+        """
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        token_refreshed = False
+        attempt = 0
+        while True:
+            sellsy_rate_limiter.acquire()
+            sent_token = self.access_token
+            response = self.session.request(method, url, **kwargs)
+
+            if response.status_code == 401 and not token_refreshed:
+                token_refreshed = True
+                if self._refresh_rejected_token(sent_token):
+                    # Réponse abandonnée : la connexion est rendue au pool (utile en mode stream)
+                    response.close()
+                    continue
+                return response
+
+            if response.status_code != 429 or attempt == RATE_LIMIT_MAX_RETRIES:
+                return response
+
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                retry_after = 2 ** attempt
+            logger.warning(f"Limite de requêtes Sellsy atteinte, nouvelle tentative dans {retry_after}s")
+            sellsy_rate_limiter.pause(retry_after)
+            response.close()
+            attempt += 1
+
+    def _make_get(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        self._ensure_token()
         try:
-            response = requests.get(f"{self.api_v2_url}{endpoint}", headers=headers, params=params)
+            response = self._send("GET", f"{self.api_v2_url}{endpoint}", params=params)
             if response.status_code == 200:
-                return response.json()
-            logger.error(f"Erreur API GET {endpoint}: {response.status_code} - {response.text}")
+                return _json_loads(response.content)
+            logger.error(f"Erreur API GET {endpoint}: {response.status_code} - {_error_body(response)}")
         except requests.RequestException as e:
             logger.error(f"Exception API GET: {e}")
+        except ValueError as e:
+            logger.error(f"Erreur de décodage JSON GET {endpoint}: {e}")
         return None
 
     def _make_post(self, endpoint: str, json_data: Dict) -> Optional[Dict[str, Any]]:
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
+        self._ensure_token()
         try:
-            response = requests.post(f"{self.api_v2_url}{endpoint}", headers=headers, json=json_data)
+            body = _json_dumps(json_data).encode("utf-8")
+            response = self._send("POST", f"{self.api_v2_url}{endpoint}", headers=_JSON_HEADERS, data=body)
             if response.status_code == 200:
-                return response.json()
-            logger.error(f"Erreur API POST {endpoint}: {response.status_code} - {response.text}")
+                return _json_loads(response.content)
+            logger.error(f"Erreur API POST {endpoint}: {response.status_code} - {_error_body(response)}")
         except requests.RequestException as e:
             logger.error(f"Exception API POST: {e}")
+        except ValueError as e:
+            logger.error(f"Erreur de décodage JSON POST {endpoint}: {e}")
         return None
 
-    def _make_v1_request(self, method: str, params: Dict = {}) -> Optional[Dict[str, Any]]:
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-
-        payload = {
+    def _make_v1_request(self, method: str, params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        self._ensure_token()
+        params = params if params is not None else {}
+        do_in = {
             "method": method,
-            "io_mode": "json",
-            "do_in": json.dumps({
-                "method": method,
-                "params": params
-            })
+            "params": params
         }
+        # Corps du formulaire : préfixe mis en cache par méthode, seul do_in est encodé à chaque appel
+        body = (_v1_form_prefix(method) + quote_plus(_json_dumps(do_in))).encode("ascii")
 
-        logger.info(f"Requête API v1 vers {self.api_v1_url} - Méthode: {method}")
-        logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
+        # Logs émis à chaque appel : formatage différé (%s), ignoré si le niveau est filtré
+        logger.info("Requête API v1 vers %s - Méthode: %s", self.api_v1_url, method)
+        # Sérialisation du payload uniquement si le niveau DEBUG est actif, en JSON compact
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Payload: %s", _json_dumps(do_in))
 
         try:
-            response = requests.post(self.api_v1_url, headers=headers, data=payload)
-            logger.info(f"Code de statut de la réponse: {response.status_code}")
+            response = self._send("POST", self.api_v1_url, headers=_FORM_HEADERS, data=body)
+            logger.info("Code de statut de la réponse: %s", response.status_code)
 
             if response.status_code == 200:
-                result = response.json()
-                logger.debug(f"Réponse réussie: {json.dumps(result, indent=2)[:500]}...")
+                result = _json_loads(response.content)
+                logger.debug("Réponse réussie: statut %s", result.get("status"))
                 return result
 
-            logger.error(f"Erreur API v1 {method}: {response.status_code} - {response.text}")
+            logger.error(f"Erreur API v1 {method}: {response.status_code} - {_error_body(response)}")
         except requests.RequestException as e:
             logger.error(f"Exception API v1: {e}")
         except json.JSONDecodeError as e:
             logger.error(f"Erreur de décodage JSON: {e}")
-            logger.error(f"Contenu de la réponse: {response.text[:500]}...")
+            logger.error(f"Contenu de la réponse: {_error_body(response)}...")
         return None
 
-    def get_supplier_invoices(self, limit: int = 100, days: int = 365) -> List[Dict]:
+    def get_supplier_invoices(self, limit: int = 100, days: int = 365, max_workers: int = 8, enrich: bool = False) -> List[Dict]:
         """
         Récupère les factures fournisseur et assure que chacune contient un ID valide
+        
+        Args:
+            limit: Nombre maximum de factures
+            days: Nombre de jours à remonter (0 pour ne pas filtrer)
+            max_workers: Nombre maximum de requêtes simultanées
+            enrich: Si True, complète avec Purchase.getOne les résumés auxquels il manque
+                    un des champs de REQUIRED_DETAIL_FIELDS
+        """
+        return list(self.iter_supplier_invoices(limit, days, max_workers, enrich))
+
+    def get_supplier_invoices_with_details(self, limit: int = 100, days: int = 365, max_workers: int = 8) -> List[Dict]:
+        """
+        Récupère les factures fournisseur complétées de leurs détails (Purchase.getOne et
+        champs personnalisés), demandés en parallèle pour toutes les factures de la liste
+        
+        Args:
+            limit: Nombre maximum de factures
+            days: Nombre de jours à remonter (0 pour ne pas filtrer)
+            max_workers: Nombre maximum de requêtes simultanées
+            
+        Returns:
+            Liste des factures dans l'ordre de Purchase.getList ; une facture dont les détails
+            n'ont pas pu être récupérés conserve son résumé
+        """
+        invoices = self.get_supplier_invoices(limit=limit, days=days, max_workers=max_workers)
+        details_by_id = self.get_supplier_invoices_details(
+            [invoice["id"] for invoice in invoices], max_workers=max_workers
+        )
+        for invoice in invoices:
+            details = details_by_id.get(invoice["id"])
+            if details:
+                invoice.update(details)
+        return invoices
+
+    def iter_supplier_invoices(self, limit: int = 100, days: int = 365, max_workers: int = 8, enrich: bool = False) -> Iterator[Dict]:
+        """
+        Itère sur les factures fournisseur au fur et à mesure de l'arrivée des pages
+        
+        La première page de Purchase.getList donne le nombre total de pages ; les pages
+        suivantes nécessaires pour atteindre la limite sont ensuite récupérées en parallèle.
+        Les factures d'une page sont produites dès que celle-ci est reçue, ce qui permet à
+        l'appelant de commencer leur traitement pendant que les pages suivantes arrivent.
+        
+        Args:
+            limit: Nombre maximum de factures
+            days: Nombre de jours à remonter (0 pour ne pas filtrer)
+            max_workers: Nombre maximum de requêtes simultanées
+            enrich: Si True, complète page par page avec Purchase.getOne les résumés
+                    auxquels il manque un des champs de REQUIRED_DETAIL_FIELDS
         """
         logger.info(f"📅 Récupération des factures fournisseur (limite: {limit}, jours: {days}) via API v1...")
 
         # Étape 1: Récupérer les IDs des factures avec Purchase.getList
+        requested_per_page = max(1, min(limit, SELLSY_PAGE_SIZE))
+        date_from = int(time.time()) - (days * 86400) if days > 0 else None
+
+        data = self._fetch_invoice_list_page(self._build_purchase_list_params(1, requested_per_page, date_from))
+        if data is None:
+            return
+
+        infos = data.get("infos") or {}
+        total_pages = 1
+        if "nbpages" in infos:
+            total_pages = int(infos["nbpages"])
+            logger.info(f"Total des pages: {total_pages}")
+
+        invoices = self._extract_invoice_summaries(data, 1, limit)
+        count = len(invoices)
+        if enrich:
+            self._enrich_invoice_summaries(invoices, max_workers)
+        yield from invoices
+
+        # Seules les pages nécessaires pour atteindre la limite sont demandées, d'après
+        # la taille de page réellement appliquée par Sellsy
+        nb_per_page = int(infos.get("nbperpage") or requested_per_page)
+        last_page = min(total_pages, -(-limit // nb_per_page))
+
+        # Une première page incomplète est forcément la dernière
+        if len(data.get("result") or {}) < nb_per_page:
+            last_page = 1
+        if last_page > 1 and count < limit:
+            pages_params = [
+                self._build_purchase_list_params(page, requested_per_page, date_from)
+                for page in range(2, last_page + 1)
+            ]
+            executor = self._thread_pool(max_workers)
+            try:
+                # Pages produites dans l'ordre, chacune dès sa réception, en s'arrêtant
+                # à la première page en erreur ou incomplète
+                pages = executor.map(self._fetch_invoice_list_page, pages_params)
+                for page, page_data in enumerate(pages, start=2):
+                    if page_data is None:
+                        break
+                    invoices = self._extract_invoice_summaries(page_data, page, limit - count)
+                    count += len(invoices)
+                    if enrich:
+                        self._enrich_invoice_summaries(invoices, max_workers)
+                    yield from invoices
+                    if count >= limit or len(page_data.get("result") or {}) < nb_per_page:
+                        break
+            finally:
+                # Arrêt anticipé (erreur, page incomplète, limite atteinte ou itération abandonnée) :
+                # les pages pas encore demandées sont annulées au lieu de consommer des appels Sellsy
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        logger.info(f"📋 {count} factures fournisseur récupérées")
+
+    def _enrich_invoice_summaries(self, invoices: List[Dict], max_workers: int) -> None:
+        """
+        Complète sur place les résumés de factures incomplets avec leurs détails (Purchase.getOne),
+        en ne sollicitant l'API que pour ceux auxquels il manque un champ requis
+        """
+        incomplete_ids = [
+            invoice["id"] for invoice in invoices
+            if any(field not in invoice for field in REQUIRED_DETAIL_FIELDS)
+        ]
+        if not incomplete_ids:
+            return
+
+        logger.info(f"🔍 {len(incomplete_ids)} résumés de factures incomplets, récupération des détails")
+        details_by_id = self.get_supplier_invoices_details(incomplete_ids, max_workers=max_workers)
+        for invoice in invoices:
+            details = details_by_id.get(invoice["id"])
+            if details:
+                invoice.update(details)
+
+    def _build_purchase_list_params(self, page: int, nb_per_page: int, date_from: Optional[int] = None) -> Dict:
+        """
+        Construit les paramètres d'une page de Purchase.getList (nouveau dictionnaire à chaque appel)
+        
+        Args:
+            page: Numéro de la page
+            nb_per_page: Nombre de factures par page
+            date_from: Timestamp de la date de document minimale, ou None pour ne pas filtrer
+            
+        Returns:
+            Paramètres de la requête
+        """
         params = {
             "pagination": {
-                "nbperpage": min(limit, 100),
-                "pagenum": 1
+                "nbperpage": nb_per_page,
+                "pagenum": page
             },
             "order": {
                 "direction": "DESC",
@@ -138,75 +644,78 @@ class SellsySupplierAPI:
         }
 
         # Ajout du filtre de date si spécifié
-        if days > 0:
-            date_from = int(time.time()) - (days * 86400)
+        if date_from is not None:
             params["search"] = {
                 "doc_date": {
                     "from": date_from
                 }
             }
+        return params
 
-        detailed_invoices = []
-        total_pages = 1
-        current_page = 1
+    def _fetch_invoice_list_page(self, page_params: Dict) -> Optional[Dict]:
+        """
+        Récupère une page de Purchase.getList
+        
+        Args:
+            page_params: Paramètres de la page, construits par _build_purchase_list_params
+            
+        Returns:
+            Contenu "response" de la page ou None en cas d'erreur
+        """
+        page = page_params["pagination"]["pagenum"]
+        logger.debug("Récupération de la page %s de la liste des factures", page)
 
-        while current_page <= total_pages and len(detailed_invoices) < limit:
-            params["pagination"]["pagenum"] = current_page
-            logger.info(f"Récupération de la page {current_page} de la liste des factures")
+        try:
+            response = self._make_v1_request("Purchase.getList", page_params)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la page {page}: {e}")
+            return None
 
-            response = self._make_v1_request("Purchase.getList", params)
+        if not response or response.get("status") != "success" or "response" not in response:
+            logger.error("Erreur lors de la récupération des factures fournisseur")
+            return None
 
-            if not response or response.get("status") != "success" or "response" not in response:
-                logger.error("Erreur lors de la récupération des factures fournisseur")
-                break
+        return response["response"]
 
-            data = response["response"]
+    def _extract_invoice_summaries(self, data: Dict, page: int, max_items: int) -> List[Dict]:
+        """
+        Extrait les résumés de factures d'une page de Purchase.getList en complétant leurs IDs
+        
+        Args:
+            data: Contenu "response" de la page
+            page: Numéro de la page (pour les logs)
+            max_items: Nombre maximum de résumés à extraire, les suivants ne sont pas traités
+        """
+        invoices = []
+        if "result" in data and isinstance(data["result"], dict):
+            for invoice_id, invoice_summary in data["result"].items():
+                if len(invoices) >= max_items:
+                    break
+                if not isinstance(invoice_summary, dict):
+                    continue
 
-            if current_page == 1 and "infos" in data and "nbpages" in data["infos"]:
-                total_pages = data["infos"]["nbpages"]
-                logger.info(f"Total des pages: {total_pages}")
+                # Les clés JSON sont déjà des chaînes : pas de conversion dans le cas courant
+                invoice_id_str = (invoice_id if isinstance(invoice_id, str) else str(invoice_id)).strip()
+                if not invoice_id_str:
+                    logger.warning("ID de facture manquant dans les résultats")
+                    continue
 
-            if "result" in data and isinstance(data["result"], dict):
-                logger.info(f"Nombre de factures sur la page {current_page}: {len(data['result'])}")
-                
-                # Pour chaque ID de facture, récupérer les détails complets immédiatement
-                for invoice_id, invoice_summary in data["result"].items():
-                    if not invoice_id:
-                        logger.warning(f"ID de facture manquant dans les résultats")
-                        continue
-                    
-                    # Vérifions que l'ID est une chaîne valide
-                    try:
-                        invoice_id_str = str(invoice_id).strip()
-                        if not invoice_id_str:
-                            logger.warning(f"ID de facture vide après conversion")
-                            continue
-                            
-                        # Complétons les informations de base depuis le résumé
-                        if isinstance(invoice_summary, dict):
-                            # Assurons-nous que ces champs essentiels sont présents
-                            invoice_summary["id"] = invoice_id_str
-                            invoice_summary["docid"] = invoice_id_str
-                            
-                            # Si docnum manque, essayons d'utiliser le champ ident
-                            if "docnum" not in invoice_summary and "ident" in invoice_summary:
-                                invoice_summary["docnum"] = invoice_summary["ident"]
-                                
-                            detailed_invoices.append(invoice_summary)
-                            logger.info(f"Ajout de la facture {invoice_id_str} aux résultats")
-                    except Exception as e:
-                        logger.error(f"Erreur lors du traitement de l'ID {invoice_id}: {e}")
-
-            current_page += 1
-
-            if len(detailed_invoices) >= limit:
-                detailed_invoices = detailed_invoices[:limit]
-                break
+                # Assurons-nous que ces champs essentiels sont présents
+                invoice_summary["id"] = invoice_id_str
+                invoice_summary["docid"] = invoice_id_str
 
-        logger.info(f"📋 {len(detailed_invoices)} factures fournisseur récupérées")
-        return detailed_invoices
+                # Si docnum manque, utilisons le champ ident
+                if "ident" in invoice_summary:
+                    invoice_summary.setdefault("docnum", invoice_summary["ident"])
 
-    def get_supplier_invoice_details(self, invoice_id: str, include_custom_fields: bool = True) -> Optional[Dict]:
+                invoices.append(invoice_summary)
+
+            # Détail par page en DEBUG : le total est journalisé une seule fois par get_supplier_invoices
+            logger.debug("Page %s: %s factures ajoutées sur %s", page, len(invoices), len(data["result"]))
+
+        return invoices
+
+    def get_supplier_invoice_details(self, invoice_id: str, include_custom_fields: bool = True, use_cache: bool = True) -> Optional[Dict]:
         """
         Récupère les détails d'une facture fournisseur via Purchase.getOne,
         avec option d'inclusion des champs personnalisés
@@ -214,6 +723,7 @@ class SellsySupplierAPI:
         Args:
             invoice_id: ID de la facture fournisseur
             include_custom_fields: Si True, inclut les champs personnalisés associés à la facture
+            use_cache: Si False, ignore le cache mémoire et interroge toujours l'API
             
         Returns:
             Dictionnaire contenant les détails de la facture ou None en cas d'erreur
@@ -221,6 +731,24 @@ class SellsySupplierAPI:
         if not invoice_id:
             logger.error("ID de facture vide, impossible de récupérer les détails")
             return None
+
+        cache_key = (str(invoice_id), include_custom_fields)
+        if use_cache and SELLSY_DETAILS_CACHE_TTL > 0:
+            with self._details_cache_lock:
+                cached = self._details_cache.get(cache_key)
+            if cached and time.time() - cached[0] < SELLSY_DETAILS_CACHE_TTL:
+                logger.debug("Détails de la facture %s servis depuis le cache", invoice_id)
+                return cached[1]
+
+        # Cache disque : une synchronisation relancée ne redemande pas les détails déjà obtenus
+        if use_cache:
+            invoice_data = self._read_disk_cache(
+                "Purchase.getOne", self._details_cache_params(cache_key), SELLSY_DETAILS_DISK_CACHE_TTL
+            )
+            if invoice_data is not None:
+                logger.debug("Détails de la facture %s servis depuis le cache disque", invoice_id)
+                self._store_details_in_memory(cache_key, invoice_data)
+                return invoice_data
             
         logger.info(f"🔍 Récupération des détails de la facture fournisseur {invoice_id}")
 
@@ -232,7 +760,7 @@ class SellsySupplierAPI:
         response = self._make_v1_request("Purchase.getOne", params)
         
         if response and response.get("status") == "success" and "response" in response:
-            logger.info(f"Détails récupérés pour la facture {invoice_id}")
+            logger.debug("Détails récupérés pour la facture %s", invoice_id)
             invoice_data = response["response"]
             
             # Ajouter l'ID explicitement pour assurer la cohérence
@@ -250,16 +778,120 @@ class SellsySupplierAPI:
                     
                     if custom_fields:
                         invoice_data["customFields"] = custom_fields
-                        logger.info(f"Ajout de {len(custom_fields)} champs personnalisés à la facture {invoice_id}")
+                        logger.debug("Ajout de %s champs personnalisés à la facture %s", len(custom_fields), invoice_id)
                     else:
                         invoice_data["customFields"] = {}
-                        logger.info(f"Aucun champ personnalisé trouvé pour la facture {invoice_id}")
+                        logger.debug("Aucun champ personnalisé trouvé pour la facture %s", invoice_id)
+
+                self._store_details_in_memory(cache_key, invoice_data)
+                self._write_disk_cache(
+                    "Purchase.getOne", self._details_cache_params(cache_key), invoice_data, SELLSY_DETAILS_DISK_CACHE_TTL
+                )
             
             return invoice_data
         else:
             logger.error(f"Impossible de récupérer les détails de la facture {invoice_id}")
             return None
 
+    def _store_details_in_memory(self, cache_key: Tuple[str, bool], invoice_data: Dict) -> None:
+        """Ajoute des détails de facture au cache mémoire"""
+        if SELLSY_DETAILS_CACHE_TTL <= 0:
+            return
+        with self._details_cache_lock:
+            self._details_cache[cache_key] = (time.time(), invoice_data)
+            # Éviction des entrées les plus anciennes au-delà de la taille maximale
+            while len(self._details_cache) > DETAILS_CACHE_MAXSIZE:
+                del self._details_cache[next(iter(self._details_cache))]
+
+    def _details_cache_params(self, cache_key: Tuple[str, bool]) -> Dict:
+        """Paramètres identifiant des détails de facture dans le cache disque"""
+        invoice_id, include_custom_fields = cache_key
+        return {"id": invoice_id, "include_custom_fields": include_custom_fields}
+
+    def _disk_cache_path(self, method: str, params: Dict) -> str:
+        """Chemin du fichier du cache disque d'un appel, haché à partir de la méthode et des paramètres"""
+        key = f"{method}:{json.dumps(params, sort_keys=True, default=str)}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(SELLSY_DETAILS_DISK_CACHE_DIR, f"{digest}.json")
+
+    def _read_disk_cache(self, method: str, params: Dict, ttl: int) -> Optional[Any]:
+        """
+        Lit le résultat d'un appel en lecture depuis le cache disque
+        
+        Args:
+            method: Méthode ou endpoint de l'API
+            params: Paramètres de l'appel
+            ttl: Âge maximum (secondes) de l'entrée, 0 pour ne pas utiliser le cache
+            
+        Returns:
+            Résultat mis en cache, ou None s'il est absent, expiré ou illisible
+        """
+        if ttl <= 0:
+            return None
+
+        path = self._disk_cache_path(method, params)
+        try:
+            if time.time() - os.path.getmtime(path) >= ttl:
+                # Entrée expirée supprimée : le cache ne grossit pas indéfiniment
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return _json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrée illisible dans le cache disque {path}: {e}")
+            return None
+
+    def _write_disk_cache(self, method: str, params: Dict, data: Any, ttl: int) -> None:
+        """Enregistre le résultat d'un appel en lecture dans le cache disque (écriture atomique), sauf si ttl vaut 0"""
+        if ttl <= 0:
+            return
+
+        path = self._disk_cache_path(method, params)
+        tmp_path = None
+        try:
+            # Nom temporaire unique : le répertoire est partagé entre threads et processus (webhook, cron)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=SELLSY_DETAILS_DISK_CACHE_DIR, prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(_json_dumps(data))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Impossible d'écrire dans le cache disque {path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_supplier_invoices_details(self, invoice_ids: List[str], max_workers: int = 16) -> Dict[str, Optional[Dict]]:
+        """
+        Récupère en parallèle les détails de plusieurs factures fournisseur
+        
+        Args:
+            invoice_ids: Liste des IDs de factures fournisseur
+            max_workers: Nombre maximum de requêtes simultanées vers l'API v1
+            
+        Returns:
+            Dictionnaire {ID de facture: détails} (None pour les factures en erreur)
+        """
+        if not invoice_ids:
+            return {}
+
+        logger.info(f"🔍 Récupération parallèle des détails de {len(invoice_ids)} factures fournisseur ({max_workers} workers)")
+
+        def fetch_details(invoice_id: str) -> Optional[Dict]:
+            # Une facture en erreur ne doit pas interrompre le reste du lot
+            try:
+                return self.get_supplier_invoice_details(invoice_id)
+            except Exception as e:
+                logger.error(f"Erreur lors de la récupération des détails de la facture {invoice_id}: {e}")
+                return None
+
+        with self._thread_pool(max_workers) as executor:
+            results = list(executor.map(fetch_details, invoice_ids))
+
+        return dict(zip(invoice_ids, results))
+
     def get_invoice_custom_fields(self, invoice_id: str) -> Dict[str, Any]:
         """
         Récupère les champs personnalisés associés à une facture fournisseur
@@ -274,7 +906,7 @@ class SellsySupplierAPI:
             logger.error("ID de facture vide, impossible de récupérer les champs personnalisés")
             return {}
             
-        logger.info(f"🔍 Récupération des champs personnalisés pour la facture {invoice_id}")
+        logger.debug("Récupération des champs personnalisés pour la facture %s", invoice_id)
         
         params = {
             "linkedtype": "purchase",  # Type d'entité pour les factures fournisseur
@@ -286,22 +918,46 @@ class SellsySupplierAPI:
         if response and response.get("status") == "success" and "response" in response:
             custom_fields = response["response"]
             if isinstance(custom_fields, dict) and custom_fields:
-                logger.info(f"Champs personnalisés récupérés pour la facture {invoice_id}: {list(custom_fields.keys())}")
+                logger.debug("Champs personnalisés récupérés pour la facture %s: %s", invoice_id, list(custom_fields))
                 return custom_fields
             else:
-                logger.info(f"Aucun champ personnalisé trouvé pour la facture {invoice_id}")
+                logger.debug("Aucun champ personnalisé trouvé pour la facture %s", invoice_id)
         else:
             logger.error(f"Erreur lors de la récupération des champs personnalisés pour la facture {invoice_id}")
         
         return {}
 
-    def get_custom_field_definitions(self, entity_type: str = "purchase") -> Dict[str, Dict]:
+    def get_custom_field_definitions(self, entity_type: str = "purchase", use_cache: bool = True) -> Dict[str, Dict]:
         """
-        Récupère les définitions des champs personnalisés pour un type d'entité
+        Récupère les définitions des champs personnalisés pour un type d'entité, conservées
+        en mémoire pendant SELLSY_CF_DEFINITIONS_CACHE_TTL secondes
         
         Args:
             entity_type: Type d'entité (ex: 'purchase', 'client', 'supplier', etc.)
+            use_cache: Si False, interroge toujours l'API
             
+        Returns:
+            Dictionnaire des définitions de champs personnalisés (clé = ID du champ)
+        """
+        if not use_cache or SELLSY_CF_DEFINITIONS_CACHE_TTL <= 0:
+            return self._fetch_custom_field_definitions(entity_type)
+
+        # Verrou conservé pendant l'appel : des formatages simultanés n'interrogent l'API qu'une fois
+        with SellsySupplierAPI._cf_definitions_lock:
+            cached = SellsySupplierAPI._cf_definitions_cache.get(entity_type)
+            if cached and time.time() - cached[0] < SELLSY_CF_DEFINITIONS_CACHE_TTL:
+                return cached[1]
+
+            definitions = self._fetch_custom_field_definitions(entity_type)
+            # Une réponse vide (erreur) n'est pas conservée pour être redemandée au prochain appel
+            if definitions:
+                SellsySupplierAPI._cf_definitions_cache[entity_type] = (time.time(), definitions)
+            return definitions
+
+    def _fetch_custom_field_definitions(self, entity_type: str) -> Dict[str, Dict]:
+        """
+        Interroge CustomFields.getList pour les définitions des champs personnalisés d'un type d'entité
+        
         Returns:
             Dictionnaire des définitions de champs personnalisés (clé = ID du champ)
         """
@@ -369,24 +1025,27 @@ class SellsySupplierAPI:
         logger.warning(f"Aucune valeur trouvée pour le champ {field_id}")
         return None
 
-    def format_invoice_with_custom_fields(self, invoice: Dict) -> Dict:
+    def format_invoice_with_custom_fields(self, invoice: Dict, cf_keys: Optional[Dict[str, str]] = None) -> Dict:
         """
         Formate les données d'une facture en incluant les champs personnalisés
         avec leurs noms lisibles
         
         Args:
             invoice: Dictionnaire contenant les données de la facture
+            cf_keys: Optionnel - Colonnes des champs personnalisés déjà calculées par
+                     _custom_field_keys (évite de les recalculer pour chaque facture d'un lot)
             
         Returns:
             Dictionnaire formaté avec les champs personnalisés
         """
         # Vérifier si nous avons déjà les champs personnalisés dans l'objet facture
         if "customFields" not in invoice:
-            logger.info(f"Récupération des champs personnalisés pour la facture {invoice.get('id', 'N/A')}")
+            logger.debug("Récupération des champs personnalisés pour la facture %s", invoice.get("id", "N/A"))
             invoice["customFields"] = self.get_invoice_custom_fields(invoice.get("id", ""))
         
         # Récupérer les définitions des champs personnalisés pour obtenir les noms
-        cf_definitions = self.get_custom_field_definitions("purchase")
+        if cf_keys is None:
+            cf_keys = self._custom_field_keys(self.get_custom_field_definitions("purchase"))
         
         formatted_invoice = {
             "ID_Facture_Fournisseur": invoice.get("id", ""),
@@ -400,25 +1059,41 @@ class SellsySupplierAPI:
             "URL": f"https://go.sellsy.com/purchase/{invoice.get('id', '')}"
         }
         
-        # Ajouter les champs personnalisés avec leurs noms lisibles
-        if invoice.get("customFields"):
-            for field_id, field_value in invoice["customFields"].items():
-                field_name = field_id
-                # Utiliser le nom du champ s'il est disponible dans les définitions
-                if field_id in cf_definitions:
-                    field_name = cf_definitions[field_id].get("name", field_id)
-                    
-                formatted_invoice[f"CF_{field_name}"] = field_value
+        # Ajouter les champs personnalisés avec leurs noms lisibles (ID du champ s'il n'a pas de définition)
+        custom_fields = invoice.get("customFields")
+        if custom_fields:
+            for field_id, field_value in custom_fields.items():
+                formatted_invoice[cf_keys.get(field_id) or f"CF_{field_id}"] = field_value
         
         return formatted_invoice
 
-    def search_purchase_invoices(self, limit: int = 100, days: int = 365) -> List[Dict]:
+    def format_invoices_batch(self, invoices: List[Dict]) -> List[Dict]:
+        """
+        Formate plusieurs factures avec leurs champs personnalisés, en calculant une seule
+        fois les colonnes des champs personnalisés pour tout le lot
+        
+        Args:
+            invoices: Liste des factures à formater
+            
+        Returns:
+            Liste des factures formatées, dans le même ordre
+        """
+        cf_keys = self._custom_field_keys(self.get_custom_field_definitions("purchase"))
+        return [self.format_invoice_with_custom_fields(invoice, cf_keys) for invoice in invoices]
+
+    def _custom_field_keys(self, cf_definitions: Dict[str, Dict]) -> Dict[str, str]:
+        """Associe à chaque ID de champ personnalisé sa colonne formatée ("CF_" + nom du champ)"""
+        cf_name_by_id = {field_id: field_data.get("name", field_id) for field_id, field_data in cf_definitions.items()}
+        return {field_id: f"CF_{field_name}" for field_id, field_name in cf_name_by_id.items()}
+
+    def search_purchase_invoices(self, limit: int = 100, days: int = 365, max_workers: int = 8) -> List[Dict]:
         """
         Méthode pour l'API V2 OCR, avec filtrage par date si nécessaire
+        
+        La première page indique le nombre total de résultats ; les pages suivantes
+        sont alors récupérées en parallèle à partir de leurs offsets.
         """
         logger.info(f"📅 Recherche des factures d'achat OCR (limite: {limit}, jours: {days})...")
-        offset = 0
-        invoices = []
 
         # Créer le filtre de date si nécessaire
         filters = {}
@@ -426,33 +1101,70 @@ class SellsySupplierAPI:
             date_from = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
             filters["created_at"] = {"$gte": date_from}
 
-        while len(invoices) < limit:
-            payload = {
-                "filters": filters,
-                "limit": min(limit - len(invoices), 100),
-                "offset": offset,
-                "order": "created_at",
-                "direction": "desc"
-            }
+        data = self._search_purchase_invoices_page(filters, 0, min(limit, 100))
+        if data is None:
+            return []
 
-            data = self._make_post("/ocr/pur-invoice/search", json_data=payload)
-            if not data or "data" not in data:
+        batch = data["data"]
+        invoices = self._valid_ocr_invoices(batch)
+        offset = len(batch)
+        total = (data.get("pagination") or {}).get("total")
+
+        while len(batch) >= 100 and len(invoices) < limit:
+            if total is not None:
+                # Total connu : toutes les pages restantes sont demandées en même temps
+                offsets = list(range(offset, min(int(total), limit), 100))
+                with self._thread_pool(max_workers) as executor:
+                    pages = list(executor.map(
+                        lambda page_offset: self._search_purchase_invoices_page(
+                            filters, page_offset, min(limit - page_offset, 100)
+                        ),
+                        offsets
+                    ))
+                for page in pages:
+                    if page is None:
+                        break
+                    invoices.extend(self._valid_ocr_invoices(page["data"]))
                 break
 
-            batch = data["data"]
-            
-            # Filtrer pour ne garder que les entrées avec ID valide
-            valid_batch = [invoice for invoice in batch if invoice.get("id")]
-            
-            invoices.extend(valid_batch)
-            logger.info(f"Lot récupéré: {len(valid_batch)} factures valides sur {len(batch)}")
-            
-            if len(batch) < 100:
+            # Total absent de la réponse : parcours page par page
+            data = self._search_purchase_invoices_page(filters, offset, min(limit - len(invoices), 100))
+            if data is None:
                 break
+            batch = data["data"]
+            invoices.extend(self._valid_ocr_invoices(batch))
             offset += len(batch)
 
+        # Les tailles de page sont bornées par la limite : troncature sur place, sans copie de la liste
+        del invoices[limit:]
         logger.info(f"Total des factures OCR récupérées: {len(invoices)}")
-        return invoices[:limit]
+        return invoices
+
+    def _search_purchase_invoices_page(self, filters: Dict, offset: int, page_limit: int) -> Optional[Dict]:
+        """
+        Récupère une page de la recherche des factures d'achat OCR
+        
+        Returns:
+            Réponse de l'API (avec la clé "data") ou None en cas d'erreur
+        """
+        payload = {
+            "filters": filters,
+            "limit": page_limit,
+            "offset": offset,
+            "order": "created_at",
+            "direction": "desc"
+        }
+
+        data = self._make_post("/ocr/pur-invoice/search", json_data=payload)
+        if not data or "data" not in data:
+            return None
+        return data
+
+    def _valid_ocr_invoices(self, batch: List[Dict]) -> List[Dict]:
+        """Filtre un lot de factures OCR pour ne garder que les entrées avec ID valide"""
+        valid_batch = [invoice for invoice in batch if invoice.get("id")]
+        logger.info(f"Lot récupéré: {len(valid_batch)} factures valides sur {len(batch)}")
+        return valid_batch
 
     def get_invoice_details(self, invoice_id: str) -> Optional[Dict]:
         """
@@ -471,7 +1183,18 @@ class SellsySupplierAPI:
         
         return details
 
-    def download_invoice_pdf(self, pdf_url: str, invoice_id: str) -> Optional[str]:
+    def download_invoice_pdf(self, pdf_url: str, invoice_id: str, force: bool = False) -> Optional[str]:
+        """
+        Télécharge le PDF d'une facture dans PDF_STORAGE_DIR
+        
+        Args:
+            pdf_url: URL du PDF
+            invoice_id: ID de la facture
+            force: Si True, télécharge le PDF même s'il est déjà présent sur disque
+            
+        Returns:
+            Chemin du PDF ou None en cas d'erreur
+        """
         if not pdf_url:
             logger.warning(f"URL PDF vide pour la facture {invoice_id}")
             return None
@@ -480,29 +1203,92 @@ class SellsySupplierAPI:
             logger.warning("ID de facture manquant pour le téléchargement PDF")
             return None
             
+        # Le PDF d'une facture ne change pas : un fichier déjà téléchargé est réutilisé
+        file_path = self._pdf_path(invoice_id)
+        if not force and self._has_pdf(file_path):
+            logger.info(f"📄 PDF déjà présent pour la facture {invoice_id}: {file_path}")
+            return file_path
+
         logger.info(f"⬇️ Téléchargement du PDF pour la facture {invoice_id}")
+        part_path = None
         try:
-            headers = {
-                "Authorization": f"Bearer {self.access_token}"
-            }
-            response = requests.get(pdf_url, headers=headers)
-            if response.status_code == 200:
-                file_path = os.path.join(PDF_STORAGE_DIR, f"invoice_{invoice_id}.pdf")
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
-                logger.info(f"📄 PDF enregistré: {file_path}")
-                return file_path
-            else:
-                logger.error(f"Erreur téléchargement PDF: {response.status_code}")
-        except requests.RequestException as e:
+            self._ensure_token()
+            # Le PDF n'est pas du JSON : l'en-tête Accept par défaut de la session est remplacé
+            # Téléchargement en flux : le PDF est écrit par blocs sans être chargé entièrement en mémoire.
+            # _send applique la limite de débit, les 429 et le renouvellement du token sur un 401
+            with self._send("GET", pdf_url, headers=_PDF_HEADERS, stream=True, timeout=PDF_DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 200:
+                    # Écriture dans un fichier temporaire renommé à la fin : un téléchargement
+                    # interrompu ne laisse jamais un PDF tronqué qui serait ensuite réutilisé.
+                    # Nom unique : deux téléchargements simultanés d'une même facture ne se mélangent pas
+                    fd, part_path = tempfile.mkstemp(
+                        dir=PDF_STORAGE_DIR, prefix=f"invoice_{invoice_id}.", suffix=".part"
+                    )
+                    with os.fdopen(fd, "wb") as f:
+                        chunks = response.iter_content(chunk_size=PDF_CHUNK_SIZE)
+                        # Signature vérifiée sur le premier bloc : une page d'erreur HTML n'est pas
+                        # lue en entier ni enregistrée comme PDF
+                        first_chunk = next(chunks, b"")
+                        if b"%PDF" not in first_chunk[:PDF_HEADER_SEARCH_SIZE]:
+                            logger.error(f"Le contenu téléchargé pour la facture {invoice_id} n'est pas un PDF")
+                            f.close()
+                            os.remove(part_path)
+                            return None
+                        f.write(first_chunk)
+                        for chunk in chunks:
+                            f.write(chunk)
+                    # mkstemp crée le fichier en 0600 : le PDF garde les droits habituels
+                    os.chmod(part_path, 0o644)
+                    os.replace(part_path, file_path)
+                    logger.info(f"📄 PDF enregistré: {file_path}")
+                    return file_path
+                else:
+                    logger.error(f"Erreur téléchargement PDF: {response.status_code}")
+        except (requests.RequestException, OSError) as e:
             logger.error(f"Erreur lors du téléchargement du PDF: {e}")
+            if part_path and os.path.exists(part_path):
+                os.remove(part_path)
         return None
 
-    def get_supplier_invoice_pdf(self, invoice_id: str) -> Optional[str]:
+    def _pdf_path(self, invoice_id: str) -> str:
+        """Chemin du PDF d'une facture dans PDF_STORAGE_DIR"""
+        return os.path.join(PDF_STORAGE_DIR, f"invoice_{invoice_id}.pdf")
+
+    def _has_pdf(self, file_path: str) -> bool:
+        """Indique si un PDF non vide a déjà été téléchargé à cet emplacement (un seul appel stat)"""
+        try:
+            return os.stat(file_path).st_size > 0
+        except OSError:
+            return False
+
+    def get_supplier_invoice_pdf(self, invoice_id: str, force: bool = False) -> Optional[str]:
+        """
+        Récupère le PDF d'une facture fournisseur (lien via Purchase.getDocumentLink, puis téléchargement)
+        
+        Args:
+            invoice_id: ID de la facture fournisseur
+            force: Si True, redemande le lien et retélécharge le PDF même s'il est déjà sur disque
+                   ou si sa récupération a échoué récemment (utilisé par le webhook)
+            
+        Returns:
+            Chemin du PDF ou None en cas d'erreur
+        """
         if not invoice_id:
             logger.warning("ID de facture manquant pour la récupération du PDF")
             return None
-            
+
+        # PDF déjà téléchargé : ni l'appel Purchase.getDocumentLink ni le téléchargement ne sont refaits
+        file_path = self._pdf_path(invoice_id)
+        if not force and self._has_pdf(file_path):
+            logger.info(f"📄 PDF déjà présent pour la facture {invoice_id}: {file_path}")
+            return file_path
+
+        # Échec récent : en synchronisation par lot, la récupération n'est retentée qu'après
+        # PDF_FAILURE_RETRY_DELAY secondes (le webhook passe force=True et la retente toujours)
+        if not force and self._has_recent_pdf_failure(invoice_id):
+            logger.warning(f"⏭️ PDF de la facture {invoice_id} en échec récent, récupération ignorée")
+            return None
+
         logger.info(f"📄 Récupération du PDF pour la facture fournisseur {invoice_id}")
 
         params = {
@@ -515,10 +1301,83 @@ class SellsySupplierAPI:
         if response and response.get("status") == "success" and "response" in response:
             pdf_url = response["response"].get("download_url")
             if pdf_url:
-                return self.download_invoice_pdf(pdf_url, invoice_id)
+                pdf_path = self.download_invoice_pdf(pdf_url, invoice_id, force=force)
+                if pdf_path:
+                    self._clear_pdf_failure(invoice_id)
+                else:
+                    self._record_pdf_failure(invoice_id, "échec du téléchargement")
+                return pdf_path
 
         logger.error(f"Impossible d'obtenir l'URL du PDF pour la facture {invoice_id}")
+        self._record_pdf_failure(invoice_id, "URL du PDF indisponible")
         return None
+
+    def _pdf_failure_path(self, invoice_id: str) -> str:
+        """Chemin du marqueur d'échec de récupération du PDF d'une facture"""
+        return os.path.join(PDF_FAILED_DIR, f"{invoice_id}.failed")
+
+    def _has_recent_pdf_failure(self, invoice_id: str) -> bool:
+        """Indique si la récupération du PDF a échoué il y a moins de PDF_FAILURE_RETRY_DELAY secondes"""
+        if PDF_FAILURE_RETRY_DELAY <= 0:
+            return False
+        try:
+            return time.time() - os.stat(self._pdf_failure_path(invoice_id)).st_mtime < PDF_FAILURE_RETRY_DELAY
+        except OSError:
+            return False
+
+    def _record_pdf_failure(self, invoice_id: str, reason: str) -> None:
+        """
+        Enregistre l'échec de récupération d'un PDF dans un fichier à part, plutôt qu'un PDF
+        vide qui passerait pour un vrai document
+        
+        Args:
+            invoice_id: ID de la facture
+            reason: Cause de l'échec, conservée avec l'horodatage pour le diagnostic
+        """
+        if PDF_FAILURE_RETRY_DELAY <= 0:
+            return
+        try:
+            os.makedirs(PDF_FAILED_DIR, exist_ok=True)
+            with open(self._pdf_failure_path(invoice_id), "w", encoding="utf-8") as f:
+                f.write(f"{datetime.datetime.now().isoformat()} {reason}\n")
+        except OSError as e:
+            logger.warning(f"Impossible d'enregistrer l'échec du PDF de la facture {invoice_id}: {e}")
+
+    def _clear_pdf_failure(self, invoice_id: str) -> None:
+        """Supprime le marqueur d'échec d'un PDF récupéré avec succès"""
+        try:
+            os.remove(self._pdf_failure_path(invoice_id))
+        except OSError:
+            pass
+
+    def get_supplier_invoice_pdfs(self, invoice_ids: List[str], max_workers: int = 8) -> Dict[str, Optional[str]]:
+        """
+        Récupère en parallèle les PDF de plusieurs factures fournisseur
+        
+        Args:
+            invoice_ids: Liste des IDs de factures fournisseur
+            max_workers: Nombre maximum de téléchargements simultanés
+            
+        Returns:
+            Dictionnaire {ID de facture: chemin du PDF} (None pour les factures en erreur)
+        """
+        if not invoice_ids:
+            return {}
+
+        logger.info(f"📄 Récupération parallèle des PDF de {len(invoice_ids)} factures fournisseur ({max_workers} workers)")
+
+        def fetch_pdf(invoice_id: str) -> Optional[str]:
+            # Un PDF en erreur ne doit pas interrompre le reste du lot
+            try:
+                return self.get_supplier_invoice_pdf(invoice_id)
+            except Exception as e:
+                logger.error(f"Erreur lors de la récupération du PDF de la facture {invoice_id}: {e}")
+                return None
+
+        with self._thread_pool(max_workers) as executor:
+            results = list(executor.map(fetch_pdf, invoice_ids))
+
+        return dict(zip(invoice_ids, results))
         
     def get_custom_field(self, field_id: str) -> Optional[Dict]:
         """
@@ -534,16 +1393,22 @@ class SellsySupplierAPI:
             logger.error("ID de champ personnalisé vide, impossible de récupérer les détails")
             return None
             
-        logger.info(f"🔍 Récupération des détails du champ personnalisé {field_id}")
-
         params = {
             "id": field_id
         }
 
+        # La définition d'un champ personnalisé change rarement : elle est lue depuis le cache disque si possible
+        cached = self._read_disk_cache("CustomFields.getOne", params, SELLSY_CF_DISK_CACHE_TTL)
+        if cached is not None:
+            return cached
+
+        logger.info(f"🔍 Récupération des détails du champ personnalisé {field_id}")
+
         response = self._make_v1_request("CustomFields.getOne", params)
         
         if response and response.get("status") == "success" and "response" in response:
             logger.info(f"Détails récupérés pour le champ personnalisé {field_id}")
+            self._write_disk_cache("CustomFields.getOne", params, response["response"], SELLSY_CF_DISK_CACHE_TTL)
             return response["response"]  # On retourne directement la partie response pour faciliter l'accès aux données
         else:
             logger.error(f"Impossible de récupérer les détails du champ personnalisé {field_id}")
@@ -551,7 +1416,8 @@ class SellsySupplierAPI:
             
     def get_all_custom_fields(self, type_filter: str = None) -> List[Dict]:
         """
-        Récupère tous les champs personnalisés
+        Récupère tous les champs personnalisés, à partir des définitions mises en cache
+        par get_custom_field_definitions (sans filtre de type d'entité)
         
         Args:
             type_filter: Optionnel - Type de champ personnalisé à filtrer (ex: 'unit', 'text', etc.)
@@ -561,30 +1427,32 @@ class SellsySupplierAPI:
         """
         logger.info(f"📋 Récupération de tous les champs personnalisés" + 
                    (f" de type {type_filter}" if type_filter else ""))
+
+        # Un seul appel CustomFields.getList pour tous les types, filtrés ensuite localement
+        definitions = self.get_custom_field_definitions("")
+        if not definitions:
+            logger.error("Impossible de récupérer la liste des champs personnalisés")
+            return []
+
+        fields_list = [
+            field_data for field_data in definitions.values()
+            if not type_filter or field_data.get("type") == type_filter
+        ]
+        logger.info(f"📋 {len(fields_list)} champs personnalisés récupérés")
+        return fields_list
+
+    def invalidate_cf_cache(self, entity_type: Optional[str] = None) -> None:
+        """
+        Vide le cache des définitions de champs personnalisés, à appeler après leur modification
         
-        params = {}
-        if type_filter:
-            params["search"] = {
-                "type": type_filter
-            }
-            
-        response = self._make_v1_request("CustomFields.getList", params)
-        
-        if response and response.get("status") == "success" and "response" in response:
-            result = response["response"]
-            if "result" in result and isinstance(result["result"], dict):
-                fields_list = []
-                for field_id, field_data in result["result"].items():
-                    # S'assurer que l'ID est inclus dans les données du champ
-                    if isinstance(field_data, dict):
-                        field_data["id"] = field_id
-                        fields_list.append(field_data)
-                    
-                logger.info(f"📋 {len(fields_list)} champs personnalisés récupérés")
-                return fields_list
-                
-        logger.error("Impossible de récupérer la liste des champs personnalisés")
-        return []
+        Args:
+            entity_type: Optionnel - Type d'entité à invalider (tous les types par défaut)
+        """
+        with SellsySupplierAPI._cf_definitions_lock:
+            if entity_type is None:
+                SellsySupplierAPI._cf_definitions_cache.clear()
+            else:
+                SellsySupplierAPI._cf_definitions_cache.pop(entity_type, None)
 
 # Exemple d'utilisation:
 """
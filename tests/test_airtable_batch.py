@@ -0,0 +1,79 @@
+import threading
+import unittest
+from unittest import mock
+
+from airtable_api import AirtableAPI
+
+
+def make_record(record_id, fields):
+    return {"id": record_id, "fields": fields}
+
+
+class BatchInsertTest(unittest.TestCase):
+    def setUp(self):
+        # Instance sans __init__ : table Airtable simulée, cache préchargé (vide)
+        self.airtable = AirtableAPI.__new__(AirtableAPI)
+        self.airtable.table = mock.Mock()
+        self.airtable._records_cache = {}
+        self.airtable._records_cache_lock = threading.Lock()
+        self.airtable._records_cache_complete = True
+        self.created = 0
+
+        def batch_create(records):
+            return [self._create(fields) for fields in records]
+
+        self.airtable.table.batch_create.side_effect = batch_create
+        self.airtable.table.create.side_effect = self._create
+
+    def _create(self, fields):
+        self.created += 1
+        return make_record(f"rec{self.created}", fields)
+
+    def invoice(self, sellsy_id, amount=0):
+        return {"ID_Facture_Fournisseur": sellsy_id, "Montant_TTC": amount}, None
+
+    def test_duplicates_written_once_with_last_occurrence(self):
+        invoices = [self.invoice("1", 10), self.invoice("2"), self.invoice("1", 20)]
+
+        results = self.airtable.batch_insert_or_update_supplier_invoices(invoices)
+
+        self.airtable.table.batch_create.assert_called_once()
+        created_fields = self.airtable.table.batch_create.call_args[0][0]
+        self.assertEqual([f["ID_Facture_Fournisseur"] for f in created_fields], ["2", "1"])
+        self.assertEqual(created_fields[1]["Montant_TTC"], 20)
+        self.assertEqual(results, ["rec2", "rec1", "rec2"])
+
+    def test_existing_invoice_updated(self):
+        self.airtable._records_cache["1"] = make_record("recExisting", {"ID_Facture_Fournisseur": "1"})
+
+        results = self.airtable.batch_insert_or_update_supplier_invoices([self.invoice("1"), self.invoice("1")])
+
+        self.airtable.table.batch_update.assert_called_once()
+        self.assertEqual(len(self.airtable.table.batch_update.call_args[0][0]), 1)
+        self.airtable.table.batch_create.assert_not_called()
+        self.assertEqual(results, ["recExisting", "recExisting"])
+
+    def test_failed_chunk_fallback_does_not_recreate_earlier_chunks(self):
+        calls = []
+
+        def batch_create(records):
+            calls.append(len(records))
+            if len(calls) == 2:
+                raise RuntimeError("Airtable indisponible")
+            return [self._create(fields) for fields in records]
+
+        self.airtable.table.batch_create.side_effect = batch_create
+        invoices = [self.invoice(str(i)) for i in range(12)]
+
+        results = self.airtable.batch_insert_or_update_supplier_invoices(invoices)
+
+        self.assertEqual(calls, [10, 2])
+        # Repli facture par facture limité à la tranche en échec
+        self.assertEqual(self.airtable.table.create.call_count, 2)
+        self.assertEqual(self.created, 12)
+        self.assertTrue(all(results))
+        self.assertEqual(len(set(results)), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
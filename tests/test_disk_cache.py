@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import sellsy_api
+from sellsy_api import SellsySupplierAPI
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = tmp_dir.name
+        patcher = mock.patch("sellsy_api.SELLSY_DETAILS_DISK_CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Instance sans __init__ : pas de demande de token réelle
+        self.api = SellsySupplierAPI.__new__(SellsySupplierAPI)
+        self.params = {"id": "42", "include_custom_fields": True}
+
+    def age(self, path, seconds):
+        old = time.time() - seconds
+        os.utime(path, (old, old))
+
+    def test_write_then_read(self):
+        self.api._write_disk_cache("Purchase.getOne", self.params, {"id": "42"}, 900)
+        self.assertEqual(self.api._read_disk_cache("Purchase.getOne", self.params, 900), {"id": "42"})
+        # Aucun fichier temporaire laissé dans le répertoire
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_expired_entry_removed_on_read(self):
+        self.api._write_disk_cache("Purchase.getOne", self.params, {"id": "42"}, 900)
+        path = self.api._disk_cache_path("Purchase.getOne", self.params)
+        self.age(path, 1000)
+
+        self.assertIsNone(self.api._read_disk_cache("Purchase.getOne", self.params, 900))
+        self.assertFalse(os.path.exists(path))
+
+    def test_disabled_when_ttl_is_zero(self):
+        self.api._write_disk_cache("Purchase.getOne", self.params, {"id": "42"}, 0)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertIsNone(self.api._read_disk_cache("Purchase.getOne", self.params, 0))
+
+    def test_prune_removes_only_old_entries(self):
+        self.api._write_disk_cache("Purchase.getOne", self.params, {"id": "42"}, 900)
+        old_params = {"id": "1", "include_custom_fields": False}
+        self.api._write_disk_cache("Purchase.getOne", old_params, {"id": "1"}, 900)
+        old_path = self.api._disk_cache_path("Purchase.getOne", old_params)
+        self.age(old_path, 2000)
+
+        sellsy_api._prune_disk_cache(900)
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(self.api._disk_cache_path("Purchase.getOne", self.params)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from sellsy_api import HTTP_RETRY
+
+
+class HttpRetryTest(unittest.TestCase):
+    def test_429_left_to_send(self):
+        # Avec Retry-After, urllib3 retenterait la 429 dans l'adaptateur sans passer par _send
+        self.assertFalse(HTTP_RETRY.is_retry("POST", 429, has_retry_after=True))
+        self.assertFalse(HTTP_RETRY.is_retry("GET", 429, has_retry_after=False))
+
+    def test_5xx_retried(self):
+        for method in ("GET", "POST"):
+            self.assertTrue(HTTP_RETRY.is_retry(method, 503, has_retry_after=True))
+            self.assertTrue(HTTP_RETRY.is_retry(method, 502))
+
+    def test_policy_kept_after_increment(self):
+        retry = HTTP_RETRY.increment("GET", "/v2/purchases")
+        self.assertFalse(retry.is_retry("GET", 429, has_retry_after=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
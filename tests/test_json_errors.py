@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from sellsy_api import SellsySupplierAPI
+
+
+def html_response(status_code=200, body=b"<html>Maintenance</html>"):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    return response
+
+
+class JsonErrorTest(unittest.TestCase):
+    def setUp(self):
+        # Instance sans __init__ : pas de demande de token réelle
+        self.api = SellsySupplierAPI.__new__(SellsySupplierAPI)
+        self.api.api_v2_url = "https://api.sellsy.com/v2"
+        self.api.token_url = "https://login.sellsy.com/oauth2/access-tokens"
+        self.api.session = mock.Mock()
+        patcher = mock.patch.object(SellsySupplierAPI, "_ensure_token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_returns_none_on_invalid_body(self):
+        for body in (b"<html>Maintenance</html>", b""):
+            with mock.patch.object(SellsySupplierAPI, "_send", return_value=html_response(body=body)):
+                self.assertIsNone(self.api._make_get("/purchases/1"))
+
+    def test_post_returns_none_on_invalid_body(self):
+        with mock.patch.object(SellsySupplierAPI, "_send", return_value=html_response()):
+            self.assertIsNone(self.api._make_post("/purchases/search", {"filters": {}}))
+
+    def test_token_request_returns_none_on_invalid_body(self):
+        self.api.session.post.return_value = html_response()
+        self.assertEqual(self.api._request_access_token(), (None, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
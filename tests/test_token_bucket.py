@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from sellsy_api import TokenBucket
+
+
+class FakeClock:
+    """Horloge simulée : time.sleep avance time.monotonic sans attendre"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher_monotonic = mock.patch("sellsy_api.time.monotonic", self.clock.monotonic)
+        patcher_sleep = mock.patch("sellsy_api.time.sleep", self.clock.sleep)
+        patcher_monotonic.start()
+        patcher_sleep.start()
+        self.addCleanup(patcher_monotonic.stop)
+        self.addCleanup(patcher_sleep.stop)
+
+    def test_burst_then_steady_rate(self):
+        bucket = TokenBucket(rate=5, capacity=10)
+        for _ in range(10):
+            bucket.acquire()
+        self.assertEqual(self.clock.now, 1000.0)
+
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 1000.2, places=4)
+
+    def test_no_refill_during_pause(self):
+        bucket = TokenBucket(rate=5, capacity=10)
+        bucket.pause(2.0)
+
+        # Premier jeton disponible une période (1 / rate) après la fin de la pause, pas avant
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 1002.2, places=4)
+
+        # Pas de rafale accumulée pendant la pause : les jetons suivants arrivent au débit nominal
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 1002.4, places=4)
+
+    def test_disabled_when_rate_is_zero(self):
+        bucket = TokenBucket(rate=0, capacity=1)
+        bucket.pause(5.0)
+        for _ in range(100):
+            bucket.acquire()
+        self.assertEqual(self.clock.now, 1000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -103,8 +103,10 @@ async def supplier_invoice_webhook(payload: bytes = Depends(validate_webhook)):
         # Convertir le payload en JSON
         data = json.loads(payload.decode('utf-8'))
         
-        # Afficher le payload complet pour déboguer
-        logger.info(f"📩 Payload complet reçu: {json.dumps(data, indent=2)}")
+        # Afficher le payload complet pour déboguer : le corps brut est journalisé tel quel,
+        # sans nouvelle sérialisation, et seulement si le niveau DEBUG est actif
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"📩 Payload complet reçu: {payload.decode('utf-8', errors='replace')}")
         
         # NEW: Vérifier la structure du format Sellsy v2 (ancienne implémentation)
         if "relatedtype" in data and "relatedid" in data:
@@ -155,7 +157,8 @@ async def supplier_invoice_webhook(payload: bytes = Depends(validate_webhook)):
         while retry_count < max_retries and not invoice_details:
             try:
                 # Utilisation de la méthode v2 pour récupérer les détails
-                invoice_details = sellsy_api.get_supplier_invoice_details(invoice_id)
+                # (sans cache : l'événement signale justement une modification de la facture)
+                invoice_details = sellsy_api.get_supplier_invoice_details(invoice_id, use_cache=False)
                 if not invoice_details and retry_count < max_retries - 1:
                     retry_count += 1
                     logger.info(f"Tentative {retry_count+1}/{max_retries} pour récupérer les détails...")
@@ -180,8 +183,9 @@ async def supplier_invoice_webhook(payload: bytes = Depends(validate_webhook)):
         # Téléchargement du PDF avec gestion des erreurs
         pdf_path = None
         try:
-            # Récupération du PDF de la facture
-            pdf_path = sellsy_api.get_supplier_invoice_pdf(invoice_id)
+            # Récupération du PDF de la facture, toujours retéléchargé : l'événement signale une
+            # modification, le PDF déjà présent sur disque peut correspondre à l'ancienne version
+            pdf_path = sellsy_api.get_supplier_invoice_pdf(invoice_id, force=True)
             if pdf_path:
                 logger.info(f"✅ PDF téléchargé: {pdf_path}")
         except Exception as e: